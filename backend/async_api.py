@@ -0,0 +1,190 @@
+"""
+Async read path: an ASGI app answering GET /search_movies on SQLAlchemy's asyncio extension (aiosqlite for
+SQLite, psycopg for PostgreSQL), so slow searches wait on the database without holding a thread each. Every
+other request is handed to the Flask app, which a2wsgi runs in a thread pool. Filters and statements come from
+queries.py and the body is encoded by serialize.py, so both paths answer with the same bytes, ETag and cache.
+Searches run on the read replicas like the Flask route's, see replicas.py.
+
+Served by `flask --app main serve --asgi`, or directly: uvicorn --factory async_api:create_asgi_app
+"""
+from urllib.parse import parse_qsl
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+from configuration import create_app, db
+from models import Genre, CollectionVersion
+from queries import parse_search, movies_statement, movie_results, projection_statement, projected_results, search_page
+from cache import get_cache, request_key, etag_for, matching_etag
+import storage
+import replicas
+import serialize
+import metrics
+from negotiation import JSON, COMPRESSORS, negotiate, content_coding
+
+# Async drivers replacing the app's sync database drivers, keyed by backend name
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+psycopg"}
+
+# Threads per process running the Flask routes, which handle the writes and the other reads
+WSGI_THREADS = 4
+
+
+def async_url(url):
+    """The app's resolved database URL with its driver swapped for the async one."""
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+async def collection_version(session):
+    """Reads the collection version through an AsyncSession."""
+    return (await session.execute(db.select(CollectionVersion.version))).scalar() or 0
+
+
+async def search(session, filters, ranked, limit, fields):
+    """Runs a /search_movies request parsed by parse_search on an AsyncSession, returning its body."""
+    # Fetch one extra row to know whether another page follows
+    if fields:
+        statement, owners = projection_statement(fields, filters, ranked, limit + 1)
+        rows = (await session.execute(statement)).all()
+        genres = {}
+        if "genre" in owners:
+            ids = [row.movie_id for row in rows]
+            genres = Genre.group_names(ids, await session.execute(Genre.names_statement(ids)))
+        results = projected_results(rows, owners, genres, ranked)
+    else:
+        rows = (await session.execute(movies_statement(filters, ranked, limit + 1))).all()
+        ids = [row.movieId for row in rows]
+        genres = Genre.group_names(ids, await session.execute(Genre.names_statement(ids)))
+        results = movie_results(rows, genres, ranked)
+    return search_page(results, limit, ranked)
+
+
+class AsyncSearchApp:
+    """ASGI app serving /search_movies from async sessions and everything else from the wrapped Flask app."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+        with flask_app.app_context():
+            self.cache = get_cache()
+            options = flask_app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+            pragmas = storage.sqlite_pragmas(flask_app.config["STORAGE_PROFILE"], flask_app.config["SQLITE_PRAGMAS"])
+            self.engine = create_async_engine(async_url(db.engine.url), **options)
+            storage.tune_engine(self.engine.sync_engine, pragmas)
+            metrics.instrument_engine(self.engine.sync_engine, flask_app.config["SLOW_QUERY_MS"])
+            self.replicas = [
+                create_async_engine(async_url(engine.url), **options) for engine in replicas.replica_engines()
+            ]
+            for engine in self.replicas:
+                storage.tune_engine(engine.sync_engine, {**pragmas, **replicas.REPLICA_PRAGMAS})
+                metrics.instrument_engine(engine.sync_engine, flask_app.config["SLOW_QUERY_MS"])
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.replica_sessions = [async_sessionmaker(engine, expire_on_commit=False) for engine in self.replicas]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http" and scope["method"] == "GET" and scope["path"] == "/search_movies":
+            await self.search_movies(scope, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Acknowledges server startup, and closes the engine's connections on shutdown."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for engine in [self.engine, *self.replicas]:
+                    await engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def read_session(self, required):
+        """
+        Opens a session on the next replica that has reached the `required` collection version, or on the primary
+        when there are no replicas or none has caught up or answers; returns it with the version it reads.
+        """
+        for sessions in replicas.rotation(self.replica_sessions):
+            session = sessions()
+            try:
+                version = await collection_version(session)
+            except DBAPIError as error:
+                await session.close()
+                replicas.skipped(session.bind.url, error)
+                continue
+            if required is None or version >= required:
+                return session, version
+            await session.close()
+        session = self.sessions()
+        return session, await collection_version(session)
+
+    async def search_movies(self, scope, send):
+        """Answers a search like the Flask route and its ETag and response cache decorators do."""
+        metrics.start_request()
+        args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        request_headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        representation = negotiate(
+            request_headers.get("accept"), request_headers.get("accept-encoding"), serialize.search_formats()
+        )
+        required = replicas.required_version(request_headers.get(replicas.VERSION_HEADER.lower()))
+        session, version = await self.read_session(required)
+        async with session:
+            key = request_key(version, scope["path"], args, representation.media_type)
+            vary = {"Vary": "Accept, Accept-Encoding"}
+            headers = {"Cache-Control": "no-cache", **vary}
+            etag = matching_etag(key, representation.encoding, parse_etags(request_headers.get("if-none-match")))
+            if etag is not None:
+                headers["ETag"] = f'"{etag}"'
+                return await self.respond(send, 304, headers, b"", request_headers)
+
+            body = self.cache.get(key) if self.cache is not None else None
+            if body is None:
+                try:
+                    # Text filters build SQL for the app's database dialect, read from its app context
+                    with self.flask_app.app_context():
+                        parsed = parse_search(args)
+                    page = await search(session, *parsed)
+                except ValueError as e:
+                    body = self.flask_app.json.response({"message": str(e)}).get_data()
+                    return await self.respond(send, 400, vary, body, request_headers)
+                body = serialize.encode_page(page, representation.media_type, self.flask_app)
+                if self.cache is not None:
+                    self.cache.set(key, body)
+                    headers["X-Cache"] = "MISS"
+            else:
+                headers["X-Cache"] = "HIT"
+
+        encoding = content_coding(body, representation.encoding, self.flask_app.config["COMPRESSION_MIN_SIZE"])
+        headers["ETag"] = f'"{etag_for(key, encoding)}"'
+        if encoding is not None:
+            body = COMPRESSORS[encoding](body)
+            headers["Content-Encoding"] = encoding
+        await self.respond(send, 200, headers, body, request_headers, representation.media_type)
+
+    async def respond(self, send, status, headers, body, request_headers, media_type=JSON):
+        """Sends a response, with the CORS headers flask-cors gives the Flask routes and the request's timings."""
+        origin = request_headers.get("origin")
+        headers = {**headers, "Access-Control-Allow-Origin": origin or "*"}
+        if origin:
+            headers["Vary"] = ", ".join(filter(None, [headers.get("Vary"), "Origin"]))
+        if status != 304:
+            headers.update({"Content-Type": media_type, "Content-Length": str(len(body))})
+        timing = metrics.finish_request("/search_movies", "GET", status, len(body))
+        if timing is not None:
+            headers["Server-Timing"] = timing
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_asgi_app():
+    """Builds the ASGI app around a new Flask app; each ASGI server worker calls it once."""
+    return AsyncSearchApp(create_app())
@@ -0,0 +1,117 @@
+from sqlalchemy import bindparam, delete, insert, update
+from configuration import db
+from models import Movie, Documentary, KidMovies, movie_genres, movie_fingerprint
+from filters import build_search_filters
+from ingest import genre_ids, chunks
+import summary
+
+# Fields a batch patch may set, keyed by the JSON names /update_movie accepts, mapped to (table, column)
+PATCHABLE_FIELDS = {
+    key: (model.__table__, column)
+    for model in (Movie, Documentary, KidMovies)
+    for key, column in model.json_columns.items()
+    if key not in ("movieId", "documentaryId", "kidMovieId", "type", "genre")
+}
+
+# Patched fields that move movies between summary buckets or change their watched/favourite counts
+SUMMARIZED_FIELDS = ("releaseYear", "ageRating", "watched", "favourite", "genre")
+
+# Patched fields the duplicate-detection fingerprint is made of
+FINGERPRINTED_FIELDS = ("title", "director", "releaseYear")
+
+
+def select_ids(selection):
+    """
+    Resolves a batch selection, either {"ids": [...]} or {"filter": {search parameters}}, to a list of movie ids.
+    Raises ValueError when the selection is missing or malformed, or its filter sets no search parameter, so an
+    empty or misspelt filter never selects the whole collection.
+    """
+    if not isinstance(selection, dict):
+        raise ValueError("Request body must be a JSON object")
+    if "ids" in selection:
+        ids = selection["ids"]
+        # JSON true and false load as bools, which are ints to isinstance, and would otherwise select ids 1 and 0
+        if not isinstance(ids, list) or not all(isinstance(movie_id, int) and not isinstance(movie_id, bool)
+                                                for movie_id in ids):
+            raise ValueError("ids must be a list of integer movie ids")
+        # Only the ids of existing movies are kept, looked up a chunk at a time to stay under parameter limits
+        existing = []
+        for chunk in chunks(list(dict.fromkeys(ids))):
+            existing.extend(db.session.execute(db.select(Movie.movie_id).where(Movie.movie_id.in_(chunk))).scalars())
+        return existing
+
+    if "filter" not in selection:
+        raise ValueError("Request must include ids or filter")
+    if not isinstance(selection["filter"], dict):
+        raise ValueError("filter must be an object of search parameters")
+    filters = build_search_filters({key: str(value) for key, value in selection["filter"].items()})
+    if not filters:
+        raise ValueError("filter must set at least one search parameter")
+
+    # Ids are resolved once up front, as the statements that follow may change what the filter matches
+    return db.session.execute(db.select(Movie.movie_id).where(*filters)).scalars().all()
+
+
+def validate_patch(patch):
+    """Checks a batch patch only sets known fields, raising ValueError otherwise."""
+    if not isinstance(patch, dict) or not patch:
+        raise ValueError("patch must be a non-empty object of fields to set")
+    unknown = [key for key in patch if key not in PATCHABLE_FIELDS and key != "genre"]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    genre = patch.get("genre")
+    if "genre" in patch and (not isinstance(genre, list) or not all(isinstance(name, str) for name in genre)):
+        raise ValueError("All genres must be strings")
+
+
+def apply_patch(ids, patch):
+    """Sets the patched fields on every selected movie with one UPDATE per table and id chunk."""
+    values = {}
+    for key, value in patch.items():
+        if key != "genre":
+            table, column = PATCHABLE_FIELDS[key]
+            values.setdefault(table, {})[column] = value
+    new_genres = genre_ids(set(patch["genre"])).values() if "genre" in patch else None
+    summarized = any(key in patch for key in SUMMARIZED_FIELDS)
+    fingerprinted = any(key in patch for key in FINGERPRINTED_FIELDS)
+
+    for chunk in chunks(ids):
+        if summarized:
+            summary.apply_deltas(db.session.connection(), summary.deltas_for_ids(chunk, -1))
+        for table, columns in values.items():
+            # Subclass tables only hold rows of their type, so other movies are left untouched
+            key = table.primary_key.columns[0]
+            db.session.execute(update(table).where(key.in_(chunk)).values(**columns))
+        if fingerprinted:
+            refresh_fingerprints(chunk)
+        if new_genres is not None:
+            db.session.execute(delete(movie_genres).where(movie_genres.c.movie_id.in_(chunk)))
+            links = [{"movie_id": movie_id, "genre_id": genre_id} for movie_id in chunk for genre_id in new_genres]
+            if links:
+                db.session.execute(insert(movie_genres), links)
+        if summarized:
+            summary.apply_deltas(db.session.connection(), summary.deltas_for_ids(chunk, 1))
+
+
+def refresh_fingerprints(ids):
+    """Recomputes the fingerprints of movies whose title, director or release year were set with Core UPDATEs."""
+    movies = Movie.__table__
+    rows = db.session.execute(
+        db.select(movies.c.movie_id, movies.c.title, movies.c.director, movies.c.release_year)
+        .where(movies.c.movie_id.in_(ids))
+    ).all()
+    if rows:
+        db.session.execute(
+            update(movies).where(movies.c.movie_id == bindparam("id")).values(fingerprint=bindparam("print")),
+            [{"id": row.movie_id, "print": movie_fingerprint(row.title, row.director, row.release_year)} for row in rows]
+        )
+
+
+def delete_movies(ids):
+    """Deletes the selected movies, their subclass rows and genre links, one DELETE per table and id chunk."""
+    for chunk in chunks(ids):
+        summary.apply_deltas(db.session.connection(), summary.deltas_for_ids(chunk, -1))
+        db.session.execute(delete(movie_genres).where(movie_genres.c.movie_id.in_(chunk)))
+        for table in (Documentary.__table__, KidMovies.__table__, Movie.__table__):
+            key = table.primary_key.columns[0]
+            db.session.execute(delete(table).where(key.in_(chunk)))
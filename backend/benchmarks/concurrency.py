@@ -0,0 +1,163 @@
+"""
+Reader/writer concurrency benchmark for the storage profiles. Seeds a synthetic collection once, then for each
+profile runs reader processes (searches) and writer processes (PATCH /update_movie) against their own copy of
+it for a fixed time, as separate server workers would, and reports the throughput, latency and failed requests
+of each side, so "database is locked" errors and readers stalled behind writers show up as numbers.
+
+Run from the backend directory:  python -m benchmarks.concurrency --output concurrency.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Search query strings the readers cycle through
+READ_QUERIES = [
+    "limit=50",
+    "type=movie&watched=true&limit=50",
+    "genre=Drama,Comedy&limit=50",
+    "q=night&limit=50",
+    "age_rating=12&favourite=true&limit=50"
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="movies to seed")
+    parser.add_argument("--readers", type=int, default=4, help="reader processes")
+    parser.add_argument("--writers", type=int, default=2, help="writer processes")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each profile's run")
+    parser.add_argument("--profiles", default="default,tuned", help="comma-separated storage profiles to compare")
+    parser.add_argument("--directory", default=os.path.join(tempfile.gettempdir(), "movie_concurrency"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def create_benchmark_app(database, profile):
+    """
+    An app on the given database file and storage profile, with the response cache off so reads hit SQLite
+    and errors raised to the caller so their messages can be counted.
+    """
+    from configuration import create_app
+    return create_app({
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + database,
+        "STORAGE_PROFILE": profile,
+        "SEARCH_CACHE": "none",
+        "PROPAGATE_EXCEPTIONS": True
+    })
+
+
+def seed_template(path, rows):
+    """Creates the seeded database every profile starts from, unless an earlier run left one."""
+    if os.path.exists(path):
+        return
+    from schema import upgrade_database
+    from configuration import db
+    from benchmarks.seed import seed_collection
+    app = create_benchmark_app(path, "default")
+    with app.app_context():
+        upgrade_database()
+        print(f"Seeding {rows} movies into {path} ...", file=sys.stderr)
+        seed_collection(rows)
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+        db.engine.dispose()
+
+
+def run_worker(role, database, profile, rows, start, deadline, results):
+    """Issues reads or writes until the deadline, then puts (role, latencies in ms, {error: count}) on `results`."""
+    app = create_benchmark_app(database, profile)
+    client = app.test_client()
+    rng = random.Random(os.getpid())
+    latencies = []
+    failures = {}
+    while time.time() < start:
+        time.sleep(0.001)
+    while time.time() < deadline:
+        began = time.perf_counter()
+        try:
+            if role == "reader":
+                client.get(f"/search_movies?{rng.choice(READ_QUERIES)}")
+            else:
+                client.patch(f"/update_movie/{rng.randint(1, rows)}", json={"watched": rng.random() < 0.5})
+        except Exception as e:
+            message = str(e).splitlines()[0]
+            failures[message] = failures.get(message, 0) + 1
+        latencies.append((time.perf_counter() - began) * 1000)
+    results.put((role, latencies, failures))
+
+
+def run_profile(args, template, profile):
+    """Runs the readers and writers against a fresh copy of the template and summarizes each side."""
+    from benchmarks.timing import summarize
+    database = os.path.join(args.directory, f"{profile}.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    shutil.copyfile(template, database)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start = time.time() + 3  # Leaves the processes time to start and build their apps
+    deadline = start + args.seconds
+    roles = ["reader"] * args.readers + ["writer"] * args.writers
+    processes = [
+        context.Process(target=run_worker, args=(role, database, profile, args.rows, start, deadline, results))
+        for role in roles
+    ]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = {"profile": profile}
+    for role in ("reader", "writer"):
+        latencies = [latency for name, samples, _ in collected if name == role for latency in samples]
+        failures = {}
+        for name, _, role_failures in collected:
+            if name == role:
+                for message, count in role_failures.items():
+                    failures[message] = failures.get(message, 0) + count
+        summary[f"{role}s"] = {
+            "requests": len(latencies),
+            "per_second": round(len(latencies) / args.seconds, 1),
+            "failed": sum(failures.values()),
+            "failures": failures,
+            **(summarize(latencies) if latencies else {})
+        }
+    return summary
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.directory, exist_ok=True)
+    template = os.path.join(args.directory, f"template_{args.rows}.db")
+    seed_template(template, args.rows)
+
+    results = [run_profile(args, template, profile.strip()) for profile in args.profiles.split(",") if profile.strip()]
+    for result in results:
+        print(f"{result['profile']}")
+        for role in ("readers", "writers"):
+            side = result[role]
+            print(f"    {role:<8} {side['per_second']:>9.1f} req/s  p50 {side.get('p50_ms', 0):>9.3f} ms  "
+                  f"p99 {side.get('p99_ms', 0):>9.3f} ms  failed {side['failed']}")
+            for message, count in side["failures"].items():
+                print(f"        {count} x {message[:100]}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "rows": args.rows, "readers": args.readers, "writers": args.writers, "seconds": args.seconds,
+                "profiles": results
+            }, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
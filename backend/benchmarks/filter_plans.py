@@ -0,0 +1,112 @@
+"""
+Filter-combination benchmark for /search_movies. Seeds a synthetic collection (1M movies by default),
+then records the EXPLAIN QUERY PLAN and p50/p99 latency of the page query for each filter combination
+the search form can produce, and of fuzzy searches, so index regressions show up as numbers.
+
+Run from the backend directory:  python -m benchmarks.filter_plans --output plans.json
+The seeded database is kept and reused by later runs with the same --database path.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+# Search query strings measured, covering the toggles, selects and range inputs of the search form
+COMBINATIONS = [
+    "",
+    "type=movie",
+    "type=documentary",
+    "type=kidMovie",
+    "watched=true",
+    "favourite=true",
+    "is_animated=true",
+    "type=movie&watched=false",
+    "type=documentary&favourite=true",
+    "type=kidMovie&is_animated=true&parental_appeal=5",
+    "favourite=true&watched=false",
+    "age_rating=12",
+    "age_rating=12&release_year=1980",
+    "type=movie&age_rating=18&release_year=1960",
+    "release_year=1950",
+    "duration=70",
+    "release_year=1990&duration=75",
+    "favourite=true&watched=false&age_rating=18",
+    "release_year=1925",
+    "duration=62",
+    "age_rating=0&release_year=1930",
+    "type=documentary&favourite=true&watched=true&release_year=1970",
+    "type=kidMovie&parental_appeal=1&age_rating=0&favourite=true",
+    # Fuzzy searches, which score a bounded number of candidates however many movies share their trigrams
+    "q=shadw&fuzzy=true",
+    "director=kurosowa&fuzzy=true",
+    "title=goldn+empir&fuzzy=true&type=movie"
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="movies to seed into an empty database")
+    parser.add_argument("--repeat", type=int, default=50, help="timed requests per combination")
+    parser.add_argument("--database", default=os.path.join(tempfile.gettempdir(), "movie_filter_plans.db"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Point the app at the benchmark database before it is created
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.abspath(args.database)
+
+    from schema import upgrade_database
+    from configuration import create_app, db
+    from models import Movie
+    from diagnostics import record_queries
+    from benchmarks.seed import seed_collection
+    from benchmarks.timing import time_calls, summarize
+
+    app = create_app()
+    with app.app_context():
+        upgrade_database()
+        existing = Movie.query.count()
+        if existing < args.rows:
+            print(f"Seeding {args.rows - existing} movies into {args.database} ...", file=sys.stderr)
+            seed_collection(args.rows - existing)
+        db.session.execute(db.text("ANALYZE"))
+
+        indexes = sorted(
+            name for (name,) in db.session.execute(db.text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex%'"
+            ))
+        )
+        client = app.test_client()
+        results = []
+        for query in COMBINATIONS:
+            url = f"/search_movies?{query}"
+            with record_queries() as statements:
+                response = client.get(url)
+            statement, parameters = statements[0]  # The page query; later statements load subclasses and genres
+            plan = [
+                row[3] for row in db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            ]
+            samples = time_calls(lambda: client.get(url), args.repeat)
+            results.append({
+                "query": query or "(unfiltered)",
+                "returned": len(response.get_json()["movies"]),
+                "plan": plan,
+                **summarize(samples)
+            })
+
+    for result in results:
+        print(f"{result['query']:<66} p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms")
+        for step in result["plan"]:
+            print(f"    {step}")
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"rows": max(existing, args.rows), "indexes": indexes, "combinations": results}, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,407 @@
+"""
+End-to-end load benchmark. Seeds a synthetic collection (see seed.py) once, then replays the same mixed workload
+of searches, additions, updates and deletions against each target, each starting from its own copy of the seeded
+database: the Flask test client in this process, and a `flask --app main serve` server over HTTP. Reports the
+throughput, p50/p95/p99 latency, failures and SQL statements per request (read from the Server-Timing header) of
+every operation, and writes them as JSON that can be diffed between commits or compared with --compare.
+
+Run from the backend directory:  python -m benchmarks.load --output load.json
+Then, after a change:             python -m benchmarks.load --output after.json --compare load.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.seed import GENRES, GENRE_WEIGHTS, TYPE_WEIGHTS, AGE_RATINGS, TITLE_WORDS, FIRST_NAMES, \
+    LAST_NAMES, TOPICS, LESSONS, random_phrase
+
+# Share of each operation in the workloads, in percent
+WORKLOADS = {
+    "read-heavy": {"search": 90, "add": 4, "update": 5, "delete": 1},
+    "mixed": {"search": 60, "add": 15, "update": 20, "delete": 5},
+    "write-heavy": {"search": 20, "add": 30, "update": 40, "delete": 10}
+}
+
+# Statement count reported by the app's Server-Timing header
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+# Seconds to wait for the HTTP server to answer after starting it
+SERVER_STARTUP_TIMEOUT = 30
+
+BACKEND_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000, help="movies to seed")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="mixed")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per target, split over the clients")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads issuing requests")
+    parser.add_argument("--targets", default="client,http", help="comma-separated targets: client, http")
+    parser.add_argument("--server-workers", type=int, default=2, help="worker processes of the HTTP server")
+    parser.add_argument("--asgi", action="store_true", help="serve searches from the async read path over HTTP")
+    parser.add_argument("--cache", default="none", help="SEARCH_CACHE setting of the app under test")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the collection and of the workload")
+    parser.add_argument("--directory", default=os.path.join(tempfile.gettempdir(), "movie_load"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="results JSON of an earlier run to print the changes against")
+    return parser.parse_args()
+
+
+def seed_template(path, rows, seed):
+    """
+    Creates the migrated and seeded database every target starts from. One left by an earlier run is reused,
+    after applying any migrations added since.
+    """
+    from schema import upgrade_database
+    from configuration import create_app, db
+    from benchmarks.seed import seed_collection
+    seeded = os.path.exists(path)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + path})
+    with app.app_context():
+        upgrade_database()
+        if not seeded:
+            print(f"Seeding {rows} movies into {path} ...", file=sys.stderr)
+            seed_collection(rows, seed=seed)
+            db.session.execute(db.text("ANALYZE"))
+            db.session.commit()
+        db.engine.dispose()
+
+
+def fresh_copy(template, name):
+    """Copies the template to a database of its own for one target, replacing an earlier run's."""
+    database = os.path.join(os.path.dirname(template), f"{name}.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    shutil.copyfile(template, database)
+    return database
+
+
+def search_url(rng):
+    """A search as users run them: mostly browsing and text or genre lookups, some narrower filters."""
+    kind = rng.choices(["browse", "q", "genre", "filters", "director", "kids"], weights=[20, 30, 20, 15, 10, 5])[0]
+    if kind == "browse":
+        query = "limit=50"
+    elif kind == "q":
+        words = [rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 2))]
+        # Users often search while still typing the last word
+        words[-1] = words[-1][:rng.randint(2, len(words[-1]))]
+        query = "q=" + "+".join(words) + "&limit=20"
+    elif kind == "genre":
+        names = set(rng.choices(GENRES, weights=GENRE_WEIGHTS, k=rng.randint(1, 2)))
+        query = "genre=" + ",".join(sorted(names)) + rng.choice(["", "&genre_mode=all"]) + "&limit=50"
+    elif kind == "filters":
+        query = rng.choice([
+            f"type=documentary&watched={rng.choice(['true', 'false'])}",
+            f"age_rating={rng.choice(AGE_RATINGS)}&favourite=true",
+            f"release_year={rng.randint(1950, 2025)}&duration={rng.randint(80, 180)}",
+            "is_animated=true&type=movie"
+        ]) + "&limit=50"
+    elif kind == "director":
+        query = f"director={rng.choice(LAST_NAMES)}&limit=50"
+    else:
+        query = f"type=kidMovie&parental_appeal={rng.randint(1, 10)}&moral_lesson={rng.choice(LESSONS).split()[-1]}"
+    return "/search_movies?" + query
+
+
+def new_movie(rng):
+    """An /add_movies body like the ones the seeded collection holds."""
+    movie_type = rng.choices(list(TYPE_WEIGHTS), weights=list(TYPE_WEIGHTS.values()))[0]
+    body = {
+        "title": random_phrase(rng, TITLE_WORDS, 1, 4),
+        "director": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "genre": sorted(set(rng.choices(GENRES, weights=GENRE_WEIGHTS, k=rng.randint(1, 3)))),
+        "releaseYear": rng.randint(1950, 2025),
+        "duration": rng.randint(60, 200),
+        # The API treats a zero rating as missing, so additions never use it
+        "ageRating": rng.choice([rating for rating in AGE_RATINGS if rating]),
+        "type": movie_type
+    }
+    if movie_type == "documentary":
+        body.update(topic=rng.choice(TOPICS), documentarian=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}")
+    elif movie_type == "kidMovie":
+        body.update(moralLesson=rng.choice(LESSONS), parentalAppeal=rng.randint(1, 10))
+    return body
+
+
+def movie_changes(rng):
+    """An /update_movie body: mostly ticking a flag, sometimes retitling or regenreing."""
+    kind = rng.choices(["flags", "title", "genre"], weights=[70, 20, 10])[0]
+    if kind == "flags":
+        return {"watched": rng.random() < 0.5, "favourite": rng.random() < 0.1}
+    if kind == "title":
+        return {"title": random_phrase(rng, TITLE_WORDS, 1, 4)}
+    return {"genre": sorted(set(rng.choices(GENRES, weights=GENRE_WEIGHTS, k=rng.randint(1, 3))))}
+
+
+def plan_requests(workload, count, ids, seed):
+    """
+    The requests one client issues, as (operation, method, url, json body) tuples. Updates and deletions only
+    touch the seeded movies in `ids`, which no other client is given, so none of them can miss.
+    """
+    rng = random.Random(seed)
+    ids = list(ids)
+    rng.shuffle(ids)
+    operations, weights = list(WORKLOADS[workload]), list(WORKLOADS[workload].values())
+    planned = []
+    for _ in range(count):
+        operation = rng.choices(operations, weights=weights)[0]
+        if operation in ("update", "delete") and not ids:
+            operation = "search"
+        if operation == "search":
+            planned.append((operation, "GET", search_url(rng), None))
+        elif operation == "add":
+            # A random movie can repeat a seeded one, which is then merged into it rather than rejected
+            planned.append((operation, "POST", "/add_movies?on_duplicate=merge", new_movie(rng)))
+        elif operation == "update":
+            planned.append((operation, "PATCH", f"/update_movie/{rng.choice(ids)}", movie_changes(rng)))
+        else:
+            planned.append((operation, "DELETE", f"/delete_movie/{ids.pop()}", None))
+    return planned
+
+
+def plan_clients(args, ids):
+    """Splits the requests and the seeded ids between the client threads."""
+    per_client = -(-args.requests // args.concurrency)
+    return [
+        plan_requests(args.workload, per_client, ids[index::args.concurrency], args.seed * 1000 + index)
+        for index in range(args.concurrency)
+    ]
+
+
+def test_client_sender(app):
+    """Returns a function making one client's requests through the Flask test client."""
+    client = app.test_client()
+
+    def send(method, url, body):
+        response = client.open(url, method=method, json=body)
+        return response.status_code, response.headers.get("Server-Timing")
+    return send
+
+
+def http_sender(address):
+    """Returns a function making one client's requests over a keep-alive HTTP connection to `address`."""
+    host, port = address.rsplit(":", 1)
+    state = {"connection": http.client.HTTPConnection(host, int(port), timeout=60)}
+
+    def send(method, url, body):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            state["connection"].request(method, url, body=data, headers=headers)
+            response = state["connection"].getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnect for the next request, e.g. after a worker was recycled
+            state["connection"].close()
+            state["connection"] = http.client.HTTPConnection(host, int(port), timeout=60)
+            raise
+        return response.status, response.getheader("Server-Timing")
+    return send
+
+
+def run_clients(plans, make_sender):
+    """Runs each plan on its own thread; returns the elapsed seconds and (operation, ms, status, queries) samples."""
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(plans) + 1)
+
+    def run(plan):
+        send = make_sender()
+        results = []
+        barrier.wait()
+        for operation, method, url, body in plan:
+            began = time.perf_counter()
+            try:
+                status, timing = send(method, url, body)
+            except Exception as e:
+                status, timing = type(e).__name__, None
+            elapsed = (time.perf_counter() - began) * 1000
+            queries = QUERIES.search(timing or "")
+            results.append((operation, elapsed, status, int(queries.group(1)) if queries else None))
+        with lock:
+            samples.extend(results)
+
+    threads = [threading.Thread(target=run, args=(plan,)) for plan in plans]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - began, samples
+
+
+def summarize_samples(samples, seconds):
+    """Throughput, latency percentiles, failures and mean statements per request of a set of samples."""
+    from benchmarks.timing import summarize
+    latencies = [elapsed for _, elapsed, _, _ in samples]
+    failures = {}
+    for _, _, status, _ in samples:
+        if not isinstance(status, int) or status >= 400:
+            failures[str(status)] = failures.get(str(status), 0) + 1
+    counted = [queries for _, _, _, queries in samples if queries is not None]
+    return {
+        "requests": len(samples),
+        "per_second": round(len(samples) / seconds, 1),
+        "failed": sum(failures.values()),
+        "failures": failures,
+        "queries_per_request": round(sum(counted) / len(counted), 2) if counted else None,
+        **(summarize(latencies) if latencies else {})
+    }
+
+
+def summarize_run(seconds, samples):
+    """The summary of every operation and of all requests together."""
+    operations = sorted({operation for operation, _, _, _ in samples})
+    return {
+        "seconds": round(seconds, 3),
+        "total": summarize_samples(samples, seconds),
+        "operations": {
+            operation: summarize_samples([sample for sample in samples if sample[0] == operation], seconds)
+            for operation in operations
+        }
+    }
+
+
+def benchmark_app(database, cache):
+    """An app on the given database, configured as the HTTP server's workers will be."""
+    from configuration import create_app
+    return create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + database, "SEARCH_CACHE": cache})
+
+
+def run_test_client(args, template, plans):
+    """Replays the plans through the Flask test client, in this process."""
+    app = benchmark_app(fresh_copy(template, "client"), args.cache)
+    seconds, samples = run_clients(plans, lambda: test_client_sender(app))
+    with app.app_context():
+        from configuration import db
+        db.engine.dispose()
+    return summarize_run(seconds, samples)
+
+
+def free_address():
+    """A local address with a port nothing listens on."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return f"127.0.0.1:{probe.getsockname()[1]}"
+
+
+def wait_until_serving(address, server):
+    """Polls the server until it answers, failing if it exits or does not come up in time."""
+    host, port = address.rsplit(":", 1)
+    deadline = time.time() + SERVER_STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"The server exited with status {server.returncode}")
+        try:
+            connection = http.client.HTTPConnection(host, int(port), timeout=1)
+            connection.request("GET", "/metrics")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"The server did not answer on {address} within {SERVER_STARTUP_TIMEOUT} seconds")
+
+
+def run_http(args, template, plans):
+    """Replays the plans over HTTP against a gunicorn server started on its own copy of the database."""
+    address = free_address()
+    command = [sys.executable, "-m", "flask", "--app", "main", "serve", "--bind", address,
+               "--workers", str(args.server_workers), *(["--asgi"] if args.asgi else [])]
+    environment = {**os.environ, "DATABASE_URL": "sqlite:///" + fresh_copy(template, "http"),
+                   "SEARCH_CACHE": args.cache}
+    server = subprocess.Popen(command, cwd=BACKEND_DIRECTORY, env=environment,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_serving(address, server)
+        seconds, samples = run_clients(plans, lambda: http_sender(address))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    return summarize_run(seconds, samples)
+
+
+TARGETS = {"client": run_test_client, "http": run_http}
+
+
+def current_commit():
+    """The checked-out commit, marked dirty when the tree has changes, or None outside a git checkout."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIRECTORY,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIRECTORY,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def print_results(results, baseline=None):
+    """Prints every target's operations, with the change from the baseline run's figures when one is given."""
+    def change(new, old):
+        return f" ({(new - old) / old:+.0%})" if old else ""
+
+    for target, run in results["targets"].items():
+        print(f"{target}: {run['seconds']} s")
+        earlier = (baseline or {}).get("targets", {}).get(target, {})
+        for operation, summary in [("total", run["total"]), *run["operations"].items()]:
+            old = earlier.get("total", {}) if operation == "total" else earlier.get("operations", {}).get(operation, {})
+            line = f"    {operation:<8}{summary['per_second']:>9.1f} req/s{change(summary['per_second'], old.get('per_second'))}"
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                if key in summary:
+                    line += f"  {key[:3]} {summary[key]:>8.3f} ms{change(summary[key], old.get(key))}"
+            if summary["queries_per_request"] is not None:
+                line += f"  {summary['queries_per_request']} queries"
+            line += f"  failed {summary['failed']}"
+            print(line)
+
+
+def main():
+    args = parse_args()
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = [target for target in targets if target not in TARGETS]
+    if unknown:
+        raise SystemExit(f"Unknown targets: {', '.join(unknown)}; expected {', '.join(TARGETS)}")
+    os.makedirs(args.directory, exist_ok=True)
+    template = os.path.join(args.directory, f"template_{args.rows}_{args.seed}.db")
+    seed_template(template, args.rows, args.seed)
+
+    # Every target replays the same requests, from the same starting collection
+    plans = plan_clients(args, list(range(1, args.rows + 1)))
+    results = {
+        "commit": current_commit(),
+        "settings": {
+            "rows": args.rows, "workload": args.workload, "mix": WORKLOADS[args.workload],
+            "requests": sum(len(plan) for plan in plans), "concurrency": args.concurrency, "cache": args.cache,
+            "server_workers": args.server_workers, "asgi": args.asgi, "seed": args.seed
+        },
+        "targets": {target: TARGETS[target](args, template, plans) for target in targets}
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as earlier:
+            baseline = json.load(earlier)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    failed = sum(run["total"]["failed"] for run in results["targets"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Backend parity harness. Seeds the same synthetic collection into a SQLite database and a PostgreSQL one, then
+issues the same reads and writes to both apps and reports every response that differs, so a query that only
+works on one database, or answers differently there, fails here rather than in production.
+
+Relevance order differs by design (bm25 on SQLite, weighted word matches on PostgreSQL), and fuzzy searches
+score in double precision on SQLite but single on PostgreSQL, so ranked and fuzzy searches are paged to the end
+and compared as sets of movies. Without --postgres-url a scratch server is started with
+the initdb and pg_ctl found on PG_BIN or PATH; PostgreSQL refuses to run as root, so run it as another user.
+The scratch server uses the C collation, which sorts text the way SQLite does.
+
+Run from the backend directory:  python -m benchmarks.parity
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from urllib.parse import parse_qs, urlsplit
+
+# Reads compared before and after the writes
+READS = [
+    "/search_movies?limit=200",
+    "/search_movies?limit=50&cursor=150",
+    "/search_movies?limit=200&type=documentary&watched=true",
+    "/search_movies?limit=200&genre=Drama,Comedy&genre_mode=all",
+    "/search_movies?limit=200&genre=drama,SCI-FI",
+    "/search_movies?limit=200&title=night&director=ku",
+    "/search_movies?limit=200&topic=space&documentarian=maria",
+    "/search_movies?limit=200&moral_lesson=friend&age_rating=7",
+    "/search_movies?limit=200&fields=title,genre,topic,moralLesson&type=kidMovie",
+    "/search_movies?limit=10&q=star",
+    "/search_movies?limit=25&q=lost+city",
+    "/search_movies?limit=25&q=night&type=movie&favourite=false",
+    "/search_movies?limit=25&q=oce&fields=title,topic",
+    "/search_movies?q=&limit=5",
+    "/search_movies?limit=25&director=kurosowa&fuzzy=true&type=documentary",
+    "/search_movies?limit=25&title=goldn+empir&fuzzy=true",
+    "/search_movies?limit=25&q=shadw+riverr&fuzzy=true&fields=title,director",
+    "/search_movies?limit=abc",
+    "/stats",
+    "/stats?include=releaseYear,genre,duration&duration_bucket=20",
+    "/stats?type=kidMovie&watched=true",
+    "/stats?q=dark",
+    "/export?format=ndjson&genre=Western",
+    "/export?format=csv&title=golden"
+]
+
+NEW_MOVIE = {"title": "Parity Night", "director": "Ada Varga", "genre": ["Drama", "Noir"], "releaseYear": 1999,
+             "duration": 101, "isAnimated": False, "ageRating": 12, "type": "documentary",
+             "topic": "Lighthouses", "documentarian": "Omar Kim"}
+
+BULK_ROWS = (
+    '{"title": "Bulk One", "director": "Chen Lee", "genre": ["Comedy"], "releaseYear": 2001, "duration": 88, '
+    '"ageRating": 7, "type": "kidMovie", "moralLesson": "Be brave", "parentalAppeal": 6}\n'
+    '{"title": "Bulk Two", "director": "Greta Sharma", "genre": ["Drama", "War"], "releaseYear": 1960, '
+    '"duration": 140, "ageRating": 16, "type": "movie"}\n'
+)
+
+# Writes applied to both databases in order, as (method, url, json body or raw NDJSON) tuples
+WRITES = [
+    ("POST", "/add_movies", NEW_MOVIE),
+    ("POST", "/bulk_add_movies?format=ndjson", BULK_ROWS),
+    ("PATCH", "/update_movie/5", {"title": "Renamed Star", "genre": ["Sci-Fi"], "watched": True}),
+    ("PATCH", "/movies/batch", {"filter": {"genre": "Horror", "type": "movie"}, "patch": {"favourite": True}}),
+    ("PATCH", "/movies/batch", {"ids": [10, 11, 12], "patch": {"ageRating": 18, "genre": ["Crime"]}}),
+    ("DELETE", "/delete_movie/7", None),
+    ("DELETE", "/movies/batch", {"filter": {"q": "ghost"}}),
+    ("PATCH", "/update_movie/999999", {"title": "Missing"})
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="movies to seed")
+    parser.add_argument("--postgres-url", help="an empty PostgreSQL database to use instead of a scratch server")
+    return parser.parse_args()
+
+
+def find_program(name):
+    """The path of a PostgreSQL server program, from PG_BIN or PATH."""
+    path = shutil.which(name, path=os.environ.get("PG_BIN") or None)
+    if path is None:
+        raise SystemExit(f"{name} not found; put the PostgreSQL binaries on PATH, set PG_BIN or pass --postgres-url")
+    return path
+
+
+@contextlib.contextmanager
+def scratch_postgres():
+    """Runs a throwaway PostgreSQL server on a Unix socket in a temporary directory; yields its database URL."""
+    directory = tempfile.mkdtemp(prefix="movie_parity_")
+    data = os.path.join(directory, "data")
+    quiet = {"stdout": subprocess.DEVNULL, "check": True}
+    subprocess.run([find_program("initdb"), "-D", data, "-U", "postgres", "-A", "trust", "-E", "UTF8",
+                    "--locale=C"], **quiet)
+    subprocess.run([find_program("pg_ctl"), "-D", data, "-l", os.path.join(directory, "server.log"), "-w",
+                    "-o", f"-k {directory} -c listen_addresses=''", "start"], **quiet)
+    try:
+        subprocess.run([find_program("createdb"), "-h", directory, "-U", "postgres", "movies"], **quiet)
+        yield f"postgresql+psycopg://postgres@/movies?host={directory}"
+    finally:
+        subprocess.run([find_program("pg_ctl"), "-D", data, "-m", "fast", "-w", "stop"], **quiet)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def seeded_app(url, rows):
+    """An app on the given database, migrated and seeded with the synthetic collection."""
+    from schema import upgrade_database
+    from configuration import create_app, db
+    from benchmarks.seed import seed_collection
+    import summary
+    app = create_app({"SQLALCHEMY_DATABASE_URI": url, "SEARCH_CACHE": "none"})
+    with app.app_context():
+        upgrade_database()
+        seed_collection(rows)
+        summary.rebuild()
+        db.engine.dispose()
+    return app
+
+
+def ranked_pages(client, url):
+    """Follows a ranked search's cursors to the last page, returning all of its movies sorted by id."""
+    movies = []
+    cursor = None
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        if response.status_code != 200:
+            return response.status_code, response.get_json()
+        body = response.get_json()
+        movies.extend(body["movies"])
+        cursor = body.get("next_cursor")
+        if not cursor:
+            return 200, sorted(movies, key=lambda movie: movie["movieId"])
+
+
+def is_ranked(method, url):
+    """Whether the request is a q= search, ordered by relevance."""
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    return method == "GET" and parts.path == "/search_movies" and bool(query.get("q") or query.get("fuzzy"))
+
+
+def respond(client, method, url, body=None):
+    """Issues one request and returns its comparable (status, body) pair."""
+    if is_ranked(method, url):
+        return ranked_pages(client, url)
+    if isinstance(body, str):
+        response = client.open(url, method=method, data=body, content_type="application/x-ndjson")
+    else:
+        response = client.open(url, method=method, json=body)
+    if response.mimetype == "application/json":
+        return response.status_code, response.get_json()
+    return response.status_code, response.get_data(as_text=True)
+
+
+def is_fuzzy(url):
+    """Whether the request is a fuzzy=true search."""
+    return parse_qs(urlsplit(url).query).get("fuzzy") == ["true"]
+
+
+def run_requests(app):
+    """
+    Issues the reads, the writes, then the reads again; returns [(request, (status, body))], with None for the
+    fuzzy searches of a PostgreSQL database without pg_trgm, which cannot answer them.
+    """
+    from configuration import db
+    from search import uses_fts5, has_trigram_extension
+    client = app.test_client()
+    reads = [("GET", url, None) for url in READS]
+    requests = reads + WRITES + reads
+    answers = []
+    with app.app_context():
+        fuzzy = uses_fts5() or has_trigram_extension(db.engine.url)
+        for method, url, body in requests:
+            skipped = is_fuzzy(url) and not fuzzy
+            answers.append((f"{method} {url}", None if skipped else respond(client, method, url, body)))
+            db.session.remove()
+        db.engine.dispose()
+    return answers
+
+
+def describe(left, right):
+    """A short description of the first difference between two response bodies."""
+    if type(left) is not type(right):
+        return f"{type(left).__name__} vs {type(right).__name__}"
+    if isinstance(left, dict):
+        for key in sorted(set(left) | set(right), key=str):
+            if left.get(key) != right.get(key):
+                return f"[{key!r}] " + describe(left.get(key), right.get(key))
+    if isinstance(left, list):
+        if len(left) != len(right):
+            return f"{len(left)} vs {len(right)} items"
+        for index, (a, b) in enumerate(zip(left, right)):
+            if a != b:
+                return f"[{index}] " + describe(a, b)
+    return f"{left!r:.80} vs {right!r:.80}"
+
+
+def main():
+    args = parse_args()
+    sqlite_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="movie_parity_"), "parity.db")
+    with contextlib.ExitStack() as stack:
+        postgres_url = args.postgres_url or stack.enter_context(scratch_postgres())
+        print(f"Seeding {args.rows} movies into SQLite and PostgreSQL ...", file=sys.stderr)
+        answers = {name: run_requests(seeded_app(url, args.rows))
+                   for name, url in (("sqlite", sqlite_url), ("postgresql", postgres_url))}
+
+    failures = skipped = 0
+    for (request, expected), (_, actual) in zip(answers["sqlite"], answers["postgresql"]):
+        if actual is None:
+            skipped += 1
+            print(f"skip  {request}: PostgreSQL has no pg_trgm")
+            continue
+        if expected == actual:
+            print(f"same  {request}")
+            continue
+        failures += 1
+        if expected[0] != actual[0]:
+            print(f"DIFF  {request}: status {expected[0]} on SQLite, {actual[0]} on PostgreSQL")
+        else:
+            print(f"DIFF  {request}: {describe(expected[1], actual[1])}")
+    compared = len(answers["sqlite"]) - skipped
+    print(f"{compared - failures} of {compared} responses match" + (f", {skipped} skipped" if skipped else ""))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Query-count harness. Runs every endpoint against a small and a larger collection and fails when
+a request issues more statements than QUERY_BUDGET, or more statements as the rows it touches grow
+(an N+1 loading pattern). Fuzzy searches are then checked to still find their best match among more near
+misses than a page holds.
+
+Run from the backend directory:  python -m benchmarks.query_counts
+"""
+import os
+import sys
+import tempfile
+
+# Point the app at a scratch database before it is created
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_counts.db")
+
+from schema import upgrade_database
+from configuration import create_app, db
+from models import Movie, Documentary, KidMovies
+from diagnostics import record_queries
+
+# Most statements a single request may issue, however many rows it returns
+QUERY_BUDGET = 10
+
+# Collection sizes (per movie type) compared against each other
+SMALL, LARGE = 5, 50
+
+# Near misses added ahead of the movies fuzzy searches must find
+DECOYS = 250
+
+# Fuzzy searches matching every decoy of one kind, with the title of the movie they must return first
+FUZZY_EXPECTED = [
+    ("/search_movies?limit=1&title=Matrix&fuzzy=true", "The Matrix"),
+    ("/search_movies?limit=1&title=goldn&fuzzy=true&type=documentary", "Golden Seas"),
+    ("/search_movies?limit=1&director=nolen&fuzzy=true", "Inception")
+]
+
+
+def seed(count):
+    """Adds `count` movies, documentaries and kids' movies, each tagged with two genres."""
+    for i in range(count):
+        common = dict(director=f"Director {i}", release_year=1950 + i % 70, duration=80 + i % 60,
+                      favourite=i % 2 == 0, is_animated=i % 3 == 0, watched=i % 4 == 0, age_rating=i % 18)
+        records = [
+            Movie(title=f"Feature {i}", **common),
+            Documentary(title=f"Documentary {i}", topic=f"Topic {i}", documentarian=f"Narrator {i}", **common),
+            KidMovies(title=f"Cartoon {i}", moral_lesson=f"Lesson {i}", parental_appeal=i % 10, **common)
+        ]
+        for record in records:
+            record.set_genres(["Drama", f"Genre {i % 7}"])
+            db.session.add(record)
+    db.session.commit()
+
+
+def seed_decoys():
+    """Adds DECOYS movies with titles near those of FUZZY_EXPECTED, then the movies those searches must find."""
+    common = dict(director="Decoy Director", release_year=2000, duration=90, age_rating=12)
+    for i in range(DECOYS):
+        db.session.add(Movie(title=f"Matriarch {i}", **common))
+        db.session.add(Movie(title=f"Golden Hour {i}", **common))
+    db.session.add(Movie(title="The Matrix", **common))
+    db.session.add(Documentary(title="Golden Seas", topic="Oceans", documentarian="Someone", **common))
+    common.pop("director")
+    db.session.add(Movie(title="Inception", director="Christopher Nolan", **common))
+    db.session.commit()
+
+
+def fuzzy_failures(client):
+    """Issues the FUZZY_EXPECTED searches and describes each not returning its movie first."""
+    failures = []
+    for url, title in FUZZY_EXPECTED:
+        movies = client.get(url).get_json()["movies"]
+        found = movies[0]["title"] if movies else None
+        if found != title:
+            failures.append(f"{url}: returned {found!r} first rather than {title!r}")
+    return failures
+
+
+def first_id(model):
+    """The lowest id among rows of the given movie type."""
+    return db.session.query(db.func.min(model.movie_id)).filter(Movie.type == model.__mapper__.polymorphic_identity).scalar()
+
+
+def cases(total):
+    """The requests to measure, as (name, method, url, json body) tuples."""
+    # Titled after the collection size, so the second measurement does not add a duplicate of the first's movie
+    new_movie = {"title": f"Added {total}", "director": "Someone", "genre": ["Drama"], "releaseYear": 2000,
+                 "duration": 90, "ageRating": 12, "type": "kidMovie", "moralLesson": "Share", "parentalAppeal": 5}
+    return [
+        ("search all", "GET", f"/search_movies?limit={total}", None),
+        ("search fields", "GET", f"/search_movies?limit={total}&fields=title,genre,topic,moralLesson", None),
+        ("search q", "GET", f"/search_movies?limit={total}&q=documentary", None),
+        ("search genre", "GET", f"/search_movies?limit={total}&genre=Drama,Genre%201&genre_mode=all", None),
+        ("search fuzzy", "GET", f"/search_movies?limit={total}&q=documentry&fuzzy=true", None),
+        ("search kid filters", "GET", f"/search_movies?limit={total}&type=kidMovie&parental_appeal=9&moral_lesson=lesson", None),
+        ("add movie", "POST", "/add_movies", new_movie),
+        ("update documentary", "PATCH", f"/update_movie/{first_id(Documentary)}", {"topic": "Changed", "genre": ["Drama", "New"]}),
+        ("delete kid movie", "DELETE", f"/delete_movie/{first_id(KidMovies)}", None)
+    ]
+
+
+def measure(client):
+    """Issues every case once and returns {name: number of statements}."""
+    total = Movie.query.count()
+    counts = {}
+    for name, method, url, body in cases(total):
+        db.session.remove()  # Start each request with an empty identity map, as a real request would
+        with record_queries() as statements:
+            response = client.open(url, method=method, json=body)
+        if response.status_code >= 400:
+            raise SystemExit(f"{name}: {method} {url} returned {response.status_code}")
+        counts[name] = len(statements)
+    return counts
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        upgrade_database()
+        client = app.test_client()
+        seed(SMALL)
+        small = measure(client)
+        seed(LARGE - SMALL)
+        large = measure(client)
+        seed_decoys()
+        failures = fuzzy_failures(client)
+
+    print(f"{'endpoint':<22}{SMALL * 3:>8} rows{LARGE * 3:>8} rows")
+    for name in small:
+        print(f"{name:<22}{small[name]:>13}{large[name]:>13}")
+        if large[name] > small[name]:
+            failures.append(f"{name}: statements grew from {small[name]} to {large[name]} with the row count")
+        if max(small[name], large[name]) > QUERY_BUDGET:
+            failures.append(f"{name}: {max(small[name], large[name])} statements exceeds the budget of {QUERY_BUDGET}")
+
+    for failure in failures:
+        print("FAIL", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
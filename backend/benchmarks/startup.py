@@ -0,0 +1,101 @@
+"""
+Startup-time check. Builds the app in fresh interpreters, as every server worker and command does, and fails
+when the fastest of several runs exceeds STARTUP_BUDGET_MS, or when startup imports a module meant to be loaded
+only by the processes that use it (LAZY_MODULES). Lists the slowest imports, from `python -X importtime`, so a
+new top-level import of something slow can be found.
+
+Run from the backend directory:  python -m benchmarks.startup
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Most milliseconds a fresh process may take to import main and call create_app. The fastest run is compared, as
+# other load on the machine only ever adds time; the budget leaves room for slower machines, so LAZY_MODULES is
+# what catches a known slow import coming back
+STARTUP_BUDGET_MS = 600
+
+# Modules the app must not import on startup: Alembic, the servers and the drivers of other configurations
+LAZY_MODULES = ["flask_migrate", "alembic", "mako", "gunicorn", "uvicorn", "a2wsgi", "aiosqlite", "psycopg"]
+
+# Builds the app and reports its startup time and the lazy modules it imported, as JSON
+STARTUP_SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+from configuration import create_app
+create_app()
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{"ms": elapsed, "imported": [name for name in {LAZY_MODULES!r} if name in sys.modules]}}))
+"""
+
+# One line of `python -X importtime` output: self and cumulative microseconds, then the indented module name
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+BACKEND_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="fresh processes to time")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="startup budget in milliseconds")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    return parser.parse_args()
+
+
+def run_python(arguments, environment):
+    """Runs a fresh interpreter in the backend directory and returns what it printed, raising if it failed."""
+    completed = subprocess.run([sys.executable, *arguments], cwd=BACKEND_DIRECTORY, env=environment,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise SystemExit(f"python {' '.join(arguments)} failed:\n{completed.stderr}")
+    return completed
+
+
+def slowest_imports(importtime_output, top):
+    """The modules with the largest cumulative import time among those imported by main or directly by it."""
+    modules = []
+    for match in IMPORT_TIME.finditer(importtime_output):
+        _, cumulative, indent, name = match.groups()
+        if len(indent) <= 3:
+            modules.append((int(cumulative) / 1000, len(indent) // 2, name))
+    modules.sort(reverse=True)
+    return modules[:top]
+
+
+def main():
+    args = parse_args()
+    # A scratch database, so the check never opens, and switches to WAL mode, the instance database
+    environment = {**os.environ, "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")}
+
+    samples, imported = [], set()
+    for _ in range(args.runs):
+        result = json.loads(run_python(["-c", STARTUP_SCRIPT], environment).stdout.splitlines()[-1])
+        samples.append(result["ms"])
+        imported.update(result["imported"])
+    fastest = min(samples)
+
+    importtime = run_python(["-X", "importtime", "-c", "import main"], environment).stderr
+    print("slowest imports (cumulative ms):")
+    for milliseconds, depth, name in slowest_imports(importtime, args.top):
+        print(f"    {milliseconds:>8.1f}  {'  ' * depth}{name}")
+    print(f"startup: fastest {fastest:.1f} ms over {args.runs} runs (median {statistics.median(samples):.1f}), "
+          f"budget {args.budget:.0f} ms")
+
+    failures = []
+    if fastest > args.budget:
+        failures.append(f"startup takes {fastest:.1f} ms, over the budget of {args.budget:.0f} ms")
+    for name in sorted(imported):
+        failures.append(f"startup imports {name}, which should only be imported where it is used")
+    for failure in failures:
+        print("FAIL", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import time
+
+
+def percentile(samples, fraction):
+    """The nearest-rank percentile of a list of samples, e.g. fraction=0.99 for p99."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_calls(function, repeat):
+    """Calls `function` `repeat` times and returns the latency of each call in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    """Summarizes millisecond latencies as p50/p95/p99 rounded to microseconds."""
+    return {
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3)
+    }
@@ -0,0 +1,248 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, g, make_response, request
+from models import CollectionVersion
+from negotiation import JSON, current_representation, content_coding
+
+
+class ResponseCache:
+    """Base class for response cache backends, keeping this process's hit and miss counters."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self.counter_lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        """Adds to one of the hit/miss/store/eviction counters."""
+        with self.counter_lock:
+            self.counters[name] += amount
+
+    def get(self, key):
+        """Returns the cached bytes for the key, or None when absent or expired."""
+        raise NotImplementedError("Subclasses must implement the `get` method.")
+
+    def set(self, key, value):
+        """Stores bytes under the key, evicting the least recently used entries beyond max_entries."""
+        raise NotImplementedError("Subclasses must implement the `set` method.")
+
+    def size(self):
+        """Returns the number of entries currently stored."""
+        raise NotImplementedError("Subclasses must implement the `size` method.")
+
+    def metrics(self):
+        """Summarizes this process's counters along with the hit ratio and current size."""
+        with self.counter_lock:
+            counters = dict(self.counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {**counters, "hit_ratio": counters["hits"] / lookups if lookups else 0.0, "size": self.size(),
+                "backend": type(self).__name__}
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        super().__init__(max_entries, ttl)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.count("hits")
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+        self.count("misses")
+        return None
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            evicted = 0
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        self.count("stores")
+        if evicted:
+            self.count("evictions", evicted)
+
+    def size(self):
+        with self.lock:
+            return len(self.entries)
+
+
+class SQLiteCache(ResponseCache):
+    """
+    Cache stored in a local SQLite file, shared by every worker process on the host.
+    Stands in for a networked shared cache; each thread keeps its own connection.
+    """
+
+    def __init__(self, path, max_entries, ttl):
+        super().__init__(max_entries, ttl)
+        self.path = path
+        self.local = threading.local()
+        self.connection().execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "expires REAL NOT NULL, used REAL NOT NULL)"
+        )
+
+    def connection(self):
+        """Returns this thread's connection, opening it in autocommit WAL mode on first use."""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self.connection()
+        now = time.time()
+        row = connection.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[1] > now:
+            connection.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+            self.count("hits")
+            return row[0]
+        if row is not None:
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.count("misses")
+        return None
+
+    def set(self, key, value):
+        connection = self.connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires, used) VALUES (?, ?, ?, ?)",
+            (key, value, now + self.ttl, now)
+        )
+        evicted = connection.execute(
+            "DELETE FROM entries WHERE key NOT IN (SELECT key FROM entries ORDER BY used DESC LIMIT ?)",
+            (self.max_entries,)
+        ).rowcount
+        self.count("stores")
+        if evicted:
+            self.count("evictions", evicted)
+
+    def size(self):
+        return self.connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def get_cache():
+    """Returns the app's response cache, built from the SEARCH_CACHE settings on first use, or None when disabled."""
+    if "search_cache" not in current_app.extensions:
+        backend = current_app.config["SEARCH_CACHE"]
+        max_entries = current_app.config["SEARCH_CACHE_SIZE"]
+        ttl = current_app.config["SEARCH_CACHE_TTL"]
+        if backend == "memory":
+            cache = MemoryCache(max_entries, ttl)
+        elif backend.startswith("sqlite:"):
+            cache = SQLiteCache(backend[len("sqlite:"):], max_entries, ttl)
+        else:
+            cache = None
+        current_app.extensions["search_cache"] = cache
+    return current_app.extensions["search_cache"]
+
+
+def collection_version():
+    """Reads the collection version once per request, shared by the caching and ETag decorators."""
+    if "collection_version" not in g:
+        g.collection_version = CollectionVersion.current()
+    return g.collection_version
+
+
+def request_key(version, path, args, media_type=JSON):
+    """
+    Keys a request on the collection version, its path, its non-empty query parameters in sorted order and
+    the media type of its body when that is not plain JSON.
+    """
+    params = sorted((key, value) for key, values in args.lists() for value in values if value != "")
+    key = f"{version}:{path}?{urlencode(params)}"
+    return key if media_type == JSON else f"{key}#{media_type}"
+
+
+def cache_key(version):
+    """The request_key of the current Flask request, in the media type negotiated for it."""
+    return request_key(version, request.path, request.args, current_representation().media_type)
+
+
+def etag_for(key, encoding=None):
+    """
+    The strong ETag of a response identified by its request_key, suffixed with the content coding it was sent
+    with, if any, so compressed and uncompressed bytes never share a tag.
+    """
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def matching_etag(key, encoding, if_none_match):
+    """
+    The ETag among those of the request_key's response that the If-None-Match header values hold, or None.
+    Whether the body is compressed depends on its size, unknown before the view runs, so the tags of both the
+    uncompressed body and the body in the negotiated coding are tried.
+    """
+    candidates = [etag_for(key)] + ([etag_for(key, encoding)] if encoding else [])
+    return next((etag for etag in candidates if if_none_match.contains_weak(etag)), None)
+
+
+def cached_response(view):
+    """Serves a read endpoint's successful responses from the response cache until the collection changes."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = get_cache()
+        if cache is None:
+            return view(*args, **kwargs)
+
+        key = cache_key(collection_version())
+        body = cache.get(key)
+        if body is not None:
+            response = current_app.response_class(body, mimetype=current_representation().media_type)
+            response.headers["X-Cache"] = "HIT"
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            cache.set(key, response.get_data())
+        response.headers["X-Cache"] = "MISS"
+        return response
+    return wrapper
+
+
+def conditional_response(view):
+    """
+    Tags a read endpoint's successful responses with a strong ETag of the collection version and query.
+    A matching If-None-Match is answered with 304 after only the version read, without querying or serializing movies.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = cache_key(collection_version())
+        encoding = current_representation().encoding
+        etag = matching_etag(key, encoding, request.if_none_match)
+        if etag is not None:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            # Tagged with the coding `negotiated` sends the body in; streamed bodies are never compressed
+            if response.is_streamed:
+                encoding = None
+            else:
+                encoding = content_coding(response.get_data(), encoding, current_app.config["COMPRESSION_MIN_SIZE"])
+            etag = etag_for(key, encoding)
+
+        # Clients may keep the response but must revalidate it, which costs a 304 when nothing changed
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
@@ -1,8 +1,12 @@
-from configuration import db, app
-from models import Movie  
+from configuration import db, create_app
+from models import Movie, CollectionVersion, SummaryCount, movie_genres
 #This file was created for testing purposes to clear the database
+app = create_app()
 with app.app_context():
-    # Clear all records from the Movie table
+    # Clear all records from the Movie table along with their genre links
+    db.session.execute(movie_genres.delete())
     db.session.query(Movie).delete()
+    db.session.query(SummaryCount).delete()  # Bulk deletes bypass the summary maintenance
+    CollectionVersion.bump()  # Invalidates cached search responses
     db.session.commit()
     print("All records cleared from the database.")
@@ -0,0 +1,121 @@
+import os
+import time
+import click
+from flask import Blueprint, current_app
+from configuration import db
+from models import CollectionVersion
+from schema import upgrade_database
+from ingest import bulk_import, READERS, DEFAULT_BATCH_SIZE, DUPLICATE_POLICIES
+from export import iter_movies, FORMATS
+from filters import build_search_filters
+import summary
+import dedupe
+import replicas
+
+# CLI commands, registered at the top level of `flask` on each app built by configuration.create_app
+commands = Blueprint("commands", __name__, cli_group=None)
+
+
+# Command to bulk import movies from an NDJSON or CSV file: flask --app main import-movies movies.csv
+@commands.cli.command("import-movies")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "data_format", type=click.Choice(sorted(READERS)), help="Defaults to the file extension.")
+@click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True, help="Rows inserted per transaction.")
+@click.option("--on-duplicate", "policy", type=click.Choice(DUPLICATE_POLICIES),
+              help="What to do with movies already in the collection; defaults to DUPLICATE_POLICY.")
+def import_movies(path, data_format, batch_size, policy):
+    """Validates and inserts every movie in PATH, reporting rejected rows."""
+    data_format = data_format or ("csv" if os.path.splitext(path)[1].lower() == ".csv" else "ndjson")
+    with open(path, "rb") as stream:
+        inserted, updated, errors = bulk_import(READERS[data_format](stream), max(1, batch_size),
+                                                policy or current_app.config["DUPLICATE_POLICY"])
+    for error in errors:
+        click.echo(f"Row {error['row']}: {error['message']}", err=True)
+    click.echo(f"{inserted} movies added, {updated} updated, {len(errors)} rows rejected")
+
+
+# Command to stream the collection to a file or stdout: flask --app main export-movies -o movies.ndjson type=documentary
+@commands.cli.command("export-movies")
+@click.argument("filters", nargs=-1)
+@click.option("--format", "data_format", type=click.Choice(sorted(FORMATS)), default="ndjson", show_default=True)
+@click.option("--output", "-o", type=click.File("w", encoding="utf-8"), default="-", help="Defaults to stdout.")
+def export_movies(filters, data_format, output):
+    """Writes every movie matching FILTERS, given as /search_movies parameters like genre=Drama."""
+    args = dict(item.split("=", 1) for item in filters if "=" in item)
+    try:
+        search_filters = build_search_filters(args)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="FILTERS")
+    encode, _ = FORMATS[data_format]
+    for chunk in encode(iter_movies(search_filters)):
+        output.write(chunk)
+
+
+# Command to recompute the statistics summary table from the movies: flask --app main rebuild-summary
+@commands.cli.command("rebuild-summary")
+def rebuild_summary():
+    """Recomputes summary_counts, reporting how many buckets had drifted from the movies tables."""
+    drifted = summary.rebuild()
+    if drifted:
+        # Cached /stats responses may hold the drifted counts
+        CollectionVersion.bump()
+        db.session.commit()
+    click.echo(f"Summary rebuilt, {drifted} buckets had drifted")
+
+
+# Command to find, and with --apply merge, movies duplicating each other: flask --app main dedupe
+@commands.cli.command("dedupe")
+@click.option("--apply", is_flag=True, help="Merge each set of duplicates into its oldest movie.")
+def dedupe_movies(apply):
+    """Lists the sets of movies with the same title, director and release year, oldest first."""
+    clusters = []
+    for cluster in dedupe.duplicate_clusters():
+        click.echo(", ".join(f"{movie_id} ({movie_type})" for movie_id, movie_type, *_ in cluster)
+                   + f": {cluster[0][2]}, {cluster[0][3]}, {cluster[0][4]}")
+        clusters.append([movie_id for movie_id, *_ in cluster])
+    if not apply:
+        click.echo(f"{len(clusters)} sets of duplicates found; run with --apply to merge them")
+        return
+    deleted = dedupe.merge_clusters(clusters)
+    if deleted:
+        CollectionVersion.bump()
+    db.session.commit()
+    click.echo(f"{len(clusters)} sets of duplicates merged, {deleted} movies deleted")
+
+
+# Command to refresh SQLite read replicas from the primary, to try replica routing locally: flask --app main sync-replicas
+@commands.cli.command("sync-replicas")
+@click.option("--every", type=float, help="Keep copying every this many seconds, simulating replication lag.")
+def sync_replicas(every):
+    """Copies the primary SQLite database over each replica in DATABASE_REPLICA_URLS."""
+    engines = replicas.replica_engines()
+    if not engines:
+        raise click.UsageError("No replicas configured; set DATABASE_REPLICA_URLS")
+    if any(engine.dialect.name != "sqlite" for engine in [db.engine, *engines]):
+        raise click.UsageError("Only SQLite replicas can be copied; other databases replicate on their own")
+    while True:
+        # Read first, so the copies hold at least this version
+        version = CollectionVersion.current()
+        db.session.remove()
+        for engine in engines:
+            replicas.copy_sqlite(db.engine.url, engine.url)
+        click.echo(f"Copied collection version {version} to {len(engines)} replicas")
+        if not every:
+            return
+        time.sleep(every)
+
+
+# Command to run the production server on every core: flask --app main serve --bind 0.0.0.0:5000
+@commands.cli.command("serve")
+@click.option("--bind", "-b", default=None, envvar="SERVE_BIND", help="Address to listen on; defaults to 127.0.0.1:5000.")
+@click.option("--workers", "-w", type=int, envvar="SERVE_WORKERS", help="Worker processes; defaults to one per core.")
+@click.option("--threads", type=int, envvar="SERVE_THREADS", help="Threads per worker process; defaults to 4.")
+@click.option("--asgi", is_flag=True, envvar="SERVE_ASGI", help="Serve searches from the async read path.")
+def serve(bind, workers, threads, asgi):
+    """Applies pending migrations, then serves the app with a gunicorn worker pool. SIGHUP reloads it gracefully."""
+    # gunicorn only runs on Unix, so it is imported when serving rather than with the other commands
+    from serve import Server, server_options, DEFAULT_BIND, DEFAULT_THREADS
+    upgrade_database()
+    # The workers are forked from this process and must not inherit its open database connections
+    db.engine.dispose()
+    Server(server_options(bind or DEFAULT_BIND, workers, threads or DEFAULT_THREADS, asgi), asgi).run()
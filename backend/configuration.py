@@ -1,16 +1,96 @@
+import os
 from flask import Flask
+from flask.cli import FlaskGroup
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from flask_migrate import Migrate
+import click
+import storage
+import replicas
+from negotiation import DEFAULT_COMPRESSION_MIN_SIZE
+import metrics
+import profiling
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)
+# Extensions are created unbound and attached to every app create_app builds; the session routes reads to replicas
+db = SQLAlchemy(session_options={"class_": replicas.RoutingSession})
+cors = CORS()
 
-# Set up database URI
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///mydatabase.db"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Migrations live next to this file
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(__file__), "migrations")
 
-# Initialize SQLAlchemy with the app
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+
+def init_migrations(app):
+    """
+    Attaches Flask-Migrate to the app. Importing it loads Alembic, which is slow, so only the processes that
+    migrate do: the flask command, whose `db` commands need it, and upgrades run by schema.upgrade_database.
+    """
+    from flask_migrate import Migrate
+    if "migrate" not in app.extensions:
+        # Batch mode lets Alembic alter SQLite tables
+        Migrate(app, db, directory=MIGRATIONS_DIRECTORY, render_as_batch=True)
+
+
+def running_flask_command():
+    """Whether the app is being built by the `flask` command line, which has imported Flask-Migrate already."""
+    context = click.get_current_context(silent=True)
+    return context is not None and isinstance(context.find_root().command, FlaskGroup)
+
+
+def create_app(config=None):
+    """
+    Builds the Flask app with its settings, extensions, routes and CLI commands; `config` overrides the settings.
+    Each server worker calls this after it starts, so no engine or connection is shared between processes.
+    """
+    app = Flask(__name__)
+
+    # Set up database URI, overridable so scripts and benchmarks can point at a scratch database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///mydatabase.db")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Search response cache: "memory" (per process), "sqlite:<path>" (shared by the workers on a host) or "none"
+    app.config["SEARCH_CACHE"] = os.environ.get("SEARCH_CACHE", "memory")
+    app.config["SEARCH_CACHE_SIZE"] = int(os.environ.get("SEARCH_CACHE_SIZE", 256))  # Entries kept before LRU eviction
+    app.config["SEARCH_CACHE_TTL"] = int(os.environ.get("SEARCH_CACHE_TTL", 300))  # Seconds an entry stays valid
+
+    # Read responses at least this many bytes long are compressed for clients accepting gzip or brotli
+    app.config["COMPRESSION_MIN_SIZE"] = int(os.environ.get("COMPRESSION_MIN_SIZE", DEFAULT_COMPRESSION_MIN_SIZE))
+
+    # SQL statements at least this many milliseconds long are logged with their parameters
+    app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", metrics.DEFAULT_SLOW_QUERY_MS))
+
+    # Request profiling, see profiling.py: the share of requests sampled, the token opting a request in and
+    # guarding the saved profiles, without which nothing is profiled, and where the newest PROFILE_KEEP are kept
+    app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+    app.config["PROFILE_TOKEN"] = os.environ.get("PROFILE_TOKEN")
+    app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", os.path.join(app.instance_path, "profiles"))
+    app.config["PROFILE_KEEP"] = int(os.environ.get("PROFILE_KEEP", profiling.DEFAULT_PROFILE_KEEP))
+
+    # What /add_movies and bulk imports do with a movie matching an existing one by title, director and release
+    # year: "reject", "upsert" or "merge" its genres (see ingest.DUPLICATE_POLICIES); ?on_duplicate= overrides it
+    app.config["DUPLICATE_POLICY"] = os.environ.get("DUPLICATE_POLICY", "reject")
+    app.config.update(config or {})
+
+    # SQLite pragmas and connection pool settings, see storage.py
+    storage.configure(app)
+
+    # Read replica binds, and the write version header browsers may read across origins, see replicas.py
+    replicas.configure(app)
+    app.config.setdefault("CORS_EXPOSE_HEADERS", [replicas.VERSION_HEADER])
+
+    cors.init_app(app)
+    db.init_app(app)
+    if running_flask_command():
+        init_migrations(app)
+    with app.app_context():
+        pragmas = storage.sqlite_pragmas(app.config["STORAGE_PROFILE"], app.config["SQLITE_PRAGMAS"])
+        storage.tune_engine(db.engine, pragmas)
+        for engine in replicas.replica_engines():
+            storage.tune_engine(engine, {**pragmas, **replicas.REPLICA_PRAGMAS})
+        for engine in db.engines.values():
+            metrics.instrument_engine(engine, app.config["SLOW_QUERY_MS"])
+
+    # Imported here because the route and command modules import db from this one
+    from main import api
+    from commands import commands
+    app.register_blueprint(api)
+    app.register_blueprint(commands)
+    return app
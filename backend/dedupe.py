@@ -0,0 +1,72 @@
+"""
+Duplicate cleanup for movies added before duplicate detection, or under the "merge" of a type-changing record.
+Movies are duplicates when their fingerprints, see models.movie_fingerprint, are equal. The duplicated
+fingerprints are found by grouping the fingerprint index, and their movies read back in fingerprint order, so
+finding every cluster takes one pass over the index rather than comparing each pair of movies.
+"""
+from itertools import groupby
+from sqlalchemy import func, insert
+from configuration import db
+from models import Movie, movie_genres
+from batch import delete_movies
+from ingest import ID_CHUNK_SIZE
+import summary
+
+
+def duplicate_clusters():
+    """
+    Yields each set of duplicate movies as a list of (movie_id, type, title, director, release_year) rows, oldest
+    movie first. Movies without a fingerprint, i.e. missing a title, director or release year, are never matched.
+    """
+    movies = Movie.__table__
+    duplicated = (
+        db.select(movies.c.fingerprint)
+        .where(movies.c.fingerprint.is_not(None))
+        .group_by(movies.c.fingerprint)
+        .having(func.count() > 1)
+    )
+    rows = db.session.execute(
+        db.select(movies.c.fingerprint, movies.c.movie_id, movies.c.type, movies.c.title, movies.c.director,
+                  movies.c.release_year)
+        .where(movies.c.fingerprint.in_(duplicated))
+        .order_by(movies.c.fingerprint, movies.c.movie_id)
+        .execution_options(yield_per=ID_CHUNK_SIZE)
+    )
+    for _, cluster in groupby(rows, key=lambda row: row.fingerprint):
+        yield [tuple(row)[1:] for row in cluster]
+
+
+def merge_clusters(clusters):
+    """
+    Keeps the oldest movie of each cluster of movie ids, adds the genres of the others to it and deletes them.
+    The kept movie's other fields are left as they are. Returns how many movies were deleted.
+    """
+    deleted = 0
+    group = []
+    for cluster in clusters:
+        group.append(cluster)
+        if sum(len(ids) for ids in group) >= ID_CHUNK_SIZE:
+            deleted += merge_group(group)
+            group = []
+    if group:
+        deleted += merge_group(group)
+    return deleted
+
+
+def merge_group(clusters):
+    """Merges a chunk of clusters, with one query per table rather than per movie."""
+    keeper = {movie_id: ids[0] for ids in clusters for movie_id in ids}
+    linked = set(db.session.execute(
+        db.select(movie_genres.c.movie_id, movie_genres.c.genre_id).where(movie_genres.c.movie_id.in_(list(keeper)))
+    ).all())
+    missing = {(keeper[movie_id], genre_id) for movie_id, genre_id in linked} - linked
+    if missing:
+        kept = sorted({movie_id for movie_id, _ in missing})
+        summary.apply_deltas(db.session.connection(), summary.deltas_for_ids(kept, -1))
+        db.session.execute(insert(movie_genres), [
+            {"movie_id": movie_id, "genre_id": genre_id} for movie_id, genre_id in sorted(missing)
+        ])
+        summary.apply_deltas(db.session.connection(), summary.deltas_for_ids(kept, 1))
+    duplicates = [movie_id for ids in clusters for movie_id in ids[1:]]
+    delete_movies(duplicates)
+    return len(duplicates)
@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from configuration import db
+
+
+@contextmanager
+def record_queries():
+    """Records every (statement, parameters) pair the app's engine executes inside the block, yielding the list they are added to."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
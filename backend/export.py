@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from configuration import db
+from models import Movie, Documentary, KidMovies, Genre
+from serialize import rows_statement, movie_json
+
+# Rows fetched from the database cursor and held in memory at a time while exporting
+EXPORT_BATCH_SIZE = 1000
+
+# CSV header: every key `to_json` can produce, base movie fields first
+CSV_COLUMNS = list({**Movie.json_columns, **Documentary.json_columns, **KidMovies.json_columns})
+
+
+def iter_movies(filters, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yields the JSON form of every movie matching the filters, streaming rows in batches of `batch_size` and
+    loading the genres of each batch in one query.
+    """
+    query = (
+        rows_statement()
+        .where(*filters)
+        .order_by(Movie.movie_id)
+        .execution_options(yield_per=batch_size, stream_results=True)
+    )
+    for rows in db.session.execute(query).partitions():
+        genres = Genre.names_by_movie([row.movieId for row in rows])
+        for row in rows:
+            yield movie_json(row, genres[row.movieId])
+
+
+def ndjson_lines(movies):
+    """Encodes each movie as one line of JSON."""
+    for movie in movies:
+        yield json.dumps(movie) + "\n"
+
+
+def csv_lines(movies):
+    """Encodes movies as CSV rows under a header row, in the format `import-movies` reads back."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for movie in movies:
+        writer.writerow({**movie, "genre": ", ".join(movie["genre"])})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Export encoders and their content types, keyed by the name used in `format=` and the CLI
+FORMATS = {
+    "ndjson": (ndjson_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv")
+}
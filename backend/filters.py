@@ -0,0 +1,86 @@
+from configuration import db
+from models import Movie, KidMovies, Genre, movie_genres
+from search import build_match, matching_ids
+
+
+def build_search_filters(args, text=True):
+    """
+    Builds the list of filter expressions for the search query parameters, raising ValueError on bad input.
+    Text filters go through the full-text index; pass text=False when the caller joins the index itself.
+    """
+    # Extract query parameters for filtering
+    genre = args.get("genre")
+    age_rating = args.get("age_rating")
+    favourite = args.get("favourite")
+    watched = args.get("watched")
+    release_year = args.get("release_year")
+    duration = args.get("duration")
+    movie_type = args.get("type")
+    is_animated = args.get("is_animated")
+    parental_appeal = args.get("parental_appeal")
+
+    filters = []
+    # q, title, director, topic, documentarian and moral_lesson are answered by one index lookup
+    match = build_match(args) if text else None
+    if match:
+        filters.append(Movie.movie_id.in_(matching_ids(match)))
+    if genre:
+        # Several comma-separated genres match movies with any (default) or all of them, ignoring case
+        names = {name.strip().lower() for name in genre.split(",") if name.strip()}
+        genre_mode = (args.get("genre_mode") or "any").lower()
+        if genre_mode not in ("any", "all"):
+            raise ValueError("Invalid genre mode, expected 'any' or 'all'")
+        lower_name = db.func.lower(Genre.name)
+        matching = (
+            db.select(movie_genres.c.movie_id)
+            .join(Genre, Genre.genre_id == movie_genres.c.genre_id)
+            .where(lower_name.in_(names))
+        )
+        if genre_mode == "all":
+            # Genres differing only in case count once, so "Drama" and "drama" on one movie are not two matches
+            matching = matching.group_by(movie_genres.c.movie_id).having(
+                db.func.count(lower_name.distinct()) == len(names)
+            )
+        filters.append(Movie.movie_id.in_(matching))
+    if age_rating:
+        try:
+            filters.append(Movie.age_rating == int(age_rating))
+        except ValueError:
+            raise ValueError("Invalid age rating format")
+    if watched is not None and watched != "":
+        filters.append(Movie.watched == (watched.lower() == "true"))
+
+    if favourite is not None and favourite != "":
+        filters.append(Movie.favourite == (favourite.lower() == "true"))
+
+    if is_animated is not None and is_animated != "":
+        filters.append(Movie.is_animated == (is_animated.lower() == "true"))
+
+    if release_year:
+        try:
+            filters.append(Movie.release_year <= int(release_year))
+        except ValueError:
+            raise ValueError("Invalid release year format")
+    if duration:
+        try:
+            filters.append(Movie.duration <= int(duration))
+        except ValueError:
+            raise ValueError("Invalid duration format")
+    if movie_type and movie_type.lower() != "all":
+        # Match the stored identity exactly, case-insensitively, so the type index can be used
+        identities = {mapper.polymorphic_identity.lower(): mapper.polymorphic_identity for mapper in Movie.__mapper__.self_and_descendants}
+        filters.append(Movie.type == identities.get(movie_type.lower(), movie_type))
+    if parental_appeal:
+        # parental_appeal lives on the kidMovies table; a correlated primary-key lookup keeps the
+        # movie_id-ordered scan able to stop after one page. It correlates on movies only, so it keeps
+        # its own kidMovies when the outer query already joins that table for its columns.
+        kid_movies = KidMovies.__table__
+        try:
+            appealing = db.select(kid_movies.c.kid_movie_id).where(
+                kid_movies.c.kid_movie_id == Movie.movie_id,
+                kid_movies.c.parental_appeal <= int(parental_appeal)
+            ).correlate(Movie.__table__)
+        except ValueError:
+            raise ValueError("Invalid parental appeal format")
+        filters.append(appealing.exists())
+    return filters
@@ -0,0 +1,378 @@
+import csv
+import io
+import json
+from flask import current_app
+from sqlalchemy import delete, insert, update
+from configuration import db
+from models import Movie, Documentary, KidMovies, Genre, CollectionVersion, movie_genres, movie_fingerprint
+import summary
+
+# Number of valid rows inserted per transaction by bulk imports
+DEFAULT_BATCH_SIZE = 5000
+
+# CSV columns converted from text before validation, which only accepts booleans in the BOOLEAN_FIELDS;
+# other columns are kept as strings
+INTEGER_FIELDS = ("releaseYear", "duration", "ageRating", "parentalAppeal")
+BOOLEAN_FIELDS = ("favourite", "isAnimated", "watched")
+
+# What an add does with a movie whose fingerprint (models.movie_fingerprint) matches an existing movie's: refuse
+# it, overwrite the existing movie's fields and genres with its own, or add its genres to the existing movie's
+DUPLICATE_POLICIES = ("reject", "upsert", "merge")
+DEFAULT_DUPLICATE_POLICY = "reject"
+
+# Ids or fingerprints bound into one IN clause, kept well under SQLite's bound-parameter limit
+ID_CHUNK_SIZE = 5000
+
+
+def chunks(values):
+    """Splits a list of ids or fingerprints into lists of at most ID_CHUNK_SIZE."""
+    return [values[start:start + ID_CHUNK_SIZE] for start in range(0, len(values), ID_CHUNK_SIZE)]
+
+
+class DuplicateMovie(ValueError):
+    """Raised for a record its duplicate policy refuses, naming the existing movie it matches."""
+
+    def __init__(self, message, movie_id):
+        super().__init__(message)
+        self.movie_id = movie_id
+
+
+def validate_movie(data):
+    """
+    Applies the /add_movies rules to one JSON record, raising ValueError with the client-facing message.
+    Returns the model to create, its column values and its genres.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Record must be a JSON object")
+    genre = data.get("genre")
+    movie_type = data.get("type")
+
+    # Validate required fields for all movie types
+    fields = {
+        "title": data.get("title"),
+        "director": data.get("director"),
+        "release_year": data.get("releaseYear"),
+        "duration": data.get("duration"),
+        "favourite": data.get("favourite"),
+        "is_animated": data.get("isAnimated"),
+        "watched": data.get("watched"),
+        "age_rating": data.get("ageRating")
+    }
+    if not all(fields[name] for name in ("title", "director", "release_year", "duration", "age_rating")) or not genre:
+        raise ValueError("Missing required fields")
+    if not isinstance(genre, list) or not all(isinstance(name, str) for name in genre):
+        raise ValueError("All genres must be strings")
+    for key in BOOLEAN_FIELDS:
+        # Left out flags default to False; anything else but a boolean, such as "false", is refused
+        if data.get(key) is not None and not isinstance(data[key], bool):
+            raise ValueError(f"{key} must be true or false")
+
+    # Determine movie type and the fields specific to it
+    if movie_type == "documentary":
+        if not data.get("topic") or not data.get("documentarian"):
+            raise ValueError("Documentary must include topic and documentarian")
+        fields.update(topic=data["topic"], documentarian=data["documentarian"])
+        return Documentary, fields, genre
+    if movie_type == "kidMovie":
+        if not data.get("moralLesson") or not data.get("parentalAppeal"):
+            raise ValueError("Kids Movie must include moral lesson and parental appeal")
+        fields.update(moral_lesson=data["moralLesson"], parental_appeal=data["parentalAppeal"])
+        return KidMovies, fields, genre
+    return Movie, fields, genre
+
+
+def parse_duplicate_policy(value):
+    """Reads an on_duplicate parameter, defaulting to the app's DUPLICATE_POLICY; raises ValueError if unknown."""
+    policy = (value or current_app.config["DUPLICATE_POLICY"]).lower()
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Invalid duplicate policy, expected one of: {', '.join(DUPLICATE_POLICIES)}")
+    return policy
+
+
+def record_fingerprint(fields):
+    """The fingerprint of a record validated by validate_movie."""
+    return movie_fingerprint(fields["title"], fields["director"], fields["release_year"])
+
+
+def existing_movies(fingerprints):
+    """
+    Looks the fingerprints up in the fingerprint index, returning {fingerprint: (movie_id, type)} of the oldest
+    movie with each one found; a collection not yet deduplicated may hold several.
+    """
+    movies = Movie.__table__
+    found = {}
+    for chunk in chunks(list(fingerprints)):
+        rows = db.session.execute(
+            db.select(movies.c.fingerprint, movies.c.movie_id, movies.c.type)
+            .where(movies.c.fingerprint.in_(chunk))
+            .order_by(movies.c.movie_id.desc())
+        )
+        # Newest first, so the oldest movie's row is the one left in the dict
+        found.update((fingerprint, (movie_id, movie_type)) for fingerprint, movie_id, movie_type in rows)
+    return found
+
+
+def refusal(movie_id, movie_type, identity, policy):
+    """The DuplicateMovie the policy raises for a record matching the given movie, or None if it accepts it."""
+    if policy == "reject":
+        return DuplicateMovie(f"Movie already exists as movie {movie_id}", movie_id)
+    if policy == "upsert" and movie_type != identity:
+        # The type decides the tables a movie has rows in, so an upsert cannot change it
+        return DuplicateMovie(f"Movie already exists as movie {movie_id}, a {movie_type}", movie_id)
+    return None
+
+
+def resolve_duplicate(model, fields, genres, policy):
+    """
+    Applies the duplicate policy to one validated record through the ORM, for /add_movies. Returns the id of the
+    existing movie it was upserted or merged into, or None if it matches none and is to be inserted. Raises
+    DuplicateMovie if the policy refuses it.
+    """
+    fingerprint = record_fingerprint(fields)
+    match = existing_movies([fingerprint]).get(fingerprint)
+    if match is None:
+        return None
+    movie_id, movie_type = match
+    refused = refusal(movie_id, movie_type, model.__mapper__.polymorphic_identity, policy)
+    if refused is not None:
+        raise refused
+    movie = db.session.get(Movie, movie_id)
+    if policy == "upsert":
+        # Fields the record leaves out keep their current values
+        for name, value in fields.items():
+            if value is not None:
+                setattr(movie, name, value)
+        movie.set_genres(genres)
+    else:
+        movie.set_genres(movie.get_genres() + list(genres))
+    return movie_id
+
+
+def combine_change(change, fields, genres, policy):
+    """Folds one more record into the (fields to set, genres) change pending for an existing movie."""
+    if policy == "upsert":
+        fields = {name: value for name, value in fields.items() if value is not None}
+        return {**(change[0] if change else {}), **fields}, list(genres)
+    return {}, [*(change[1] if change else []), *genres]
+
+
+def resolve_batch(batch, policy):
+    """
+    Applies the duplicate policy to a batch of validated (row number, model, fields, genres) records, against
+    the existing movies with one indexed lookup and against the batch's earlier records. Returns the records to
+    insert, the changes to existing movies as {movie_id: (fields to set, genres)} and the refused rows' errors.
+    """
+    fingerprints = [record_fingerprint(fields) for _, _, fields, _ in batch]
+    existing = existing_movies(set(fingerprints))
+    inserts, pending, changes, errors = [], {}, {}, []
+    for (number, model, fields, genres), fingerprint in zip(batch, fingerprints):
+        identity = model.__mapper__.polymorphic_identity
+        if fingerprint in existing:
+            movie_id, movie_type = existing[fingerprint]
+            refused = refusal(movie_id, movie_type, identity, policy)
+            if refused is not None:
+                errors.append({"row": number, "message": str(refused)})
+            else:
+                changes[movie_id] = combine_change(changes.get(movie_id), fields, genres, policy)
+        elif fingerprint in pending:
+            # A repeat within the batch is folded into the record it repeats, which is not inserted yet
+            index = pending[fingerprint]
+            first_number, first_model, first_fields, first_genres = inserts[index]
+            if policy == "reject" or first_model is not model and policy == "upsert":
+                errors.append({"row": number, "message": f"Movie already exists as row {first_number}"})
+                continue
+            change_fields, change_genres = combine_change((first_fields, first_genres), fields, genres, policy)
+            inserts[index] = (first_number, first_model, {**first_fields, **change_fields}, change_genres)
+        else:
+            pending[fingerprint] = len(inserts)
+            inserts.append((number, model, fields, genres))
+    return inserts, changes, errors
+
+
+def update_existing(changes, policy):
+    """
+    Writes the upserted fields and genres, or the merged genres, of existing movies. Duplicates are the exception
+    in an import, so each movie's fields get their own UPDATE, while genre links are replaced in bulk.
+    """
+    movie_ids = list(changes)
+    ids = genre_ids({name for _, genres in changes.values() for name in genres})
+    tables = [model.__table__ for model in (Movie, Documentary, KidMovies)]
+    for chunk in chunks(movie_ids):
+        summary.apply_deltas(db.session.connection(), summary.deltas_for_ids(chunk, -1))
+        for movie_id in chunk:
+            fields = changes[movie_id][0]
+            for table in tables:
+                values = {name: value for name, value in fields.items() if name in table.c}
+                if values:
+                    key = table.primary_key.columns[0]
+                    db.session.execute(update(table).where(key == movie_id).values(**values))
+
+        if policy == "upsert":
+            db.session.execute(delete(movie_genres).where(movie_genres.c.movie_id.in_(chunk)))
+            linked = set()
+        else:
+            linked = set(db.session.execute(
+                db.select(movie_genres.c.movie_id, movie_genres.c.genre_id).where(movie_genres.c.movie_id.in_(chunk))
+            ).all())
+        links = {(movie_id, ids[name]) for movie_id in chunk for name in changes[movie_id][1]} - linked
+        if links:
+            db.session.execute(insert(movie_genres), [
+                {"movie_id": movie_id, "genre_id": genre_id} for movie_id, genre_id in sorted(links)
+            ])
+        summary.apply_deltas(db.session.connection(), summary.deltas_for_ids(chunk, 1))
+
+
+def parse_csv_row(row):
+    """Converts a CSV row keyed by the /add_movies JSON names into the values a JSON record would hold."""
+    data = {key: value.strip() for key, value in row.items() if key and value is not None and value.strip()}
+    for key in INTEGER_FIELDS:
+        if key in data:
+            try:
+                data[key] = int(data[key])
+            except ValueError:
+                raise ValueError(f"Invalid {key} format")
+    for key in BOOLEAN_FIELDS:
+        if key in data:
+            data[key] = data[key].lower() in ("true", "1", "yes")
+    # Genres share the comma-separated format of the add movie form
+    if "genre" in data:
+        data["genre"] = [name.strip() for name in data["genre"].split(",") if name.strip()]
+    return data
+
+
+def read_ndjson(stream):
+    """Yields (line number, record or ValueError) for each non-blank line of a binary NDJSON stream."""
+    for number, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8"), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError:
+            yield number, ValueError("Invalid JSON")
+
+
+def read_csv(stream):
+    """Yields (line number, record or ValueError) for each data row of a binary CSV stream with a header row."""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    for row in reader:
+        try:
+            yield reader.line_num, parse_csv_row(row)
+        except ValueError as e:
+            yield reader.line_num, e
+
+
+# Readers for the supported bulk formats, keyed by the name used in `format=` and the CLI
+READERS = {"ndjson": read_ndjson, "csv": read_csv}
+
+
+def genre_ids(names):
+    """Returns {name: genre_id} for the given genre names, creating the missing ones."""
+    genres = Genre.__table__
+    known = dict(db.session.execute(db.select(genres.c.name, genres.c.genre_id).where(genres.c.name.in_(names))).all())
+    missing = [{"name": name} for name in names if name not in known]
+    if missing:
+        db.session.execute(insert(genres), missing)
+        known.update(db.session.execute(
+            db.select(genres.c.name, genres.c.genre_id).where(genres.c.name.in_([row["name"] for row in missing]))
+        ).all())
+    return known
+
+
+def insert_batch(batch):
+    """Inserts validated (model, fields, genres) records with one executemany per table."""
+    movies_table = Movie.__table__
+    base_columns = {column.name for column in movies_table.columns} - {"movie_id"}
+    ids = genre_ids({name for _, _, genres in batch for name in genres})
+
+    links = []
+    deltas = summary.empty_deltas()
+    for model in (Movie, Documentary, KidMovies):
+        records = [(fields, genres) for record_model, fields, genres in batch if record_model is model]
+        if not records:
+            continue
+        identity = model.__mapper__.polymorphic_identity
+        # Boolean flags left out of a record fall back to False, as the column defaults do
+        base_rows = [
+            {**{name: fields.get(name) for name in base_columns - {"type"}}, "type": identity,
+             "favourite": bool(fields["favourite"]), "is_animated": bool(fields["is_animated"]),
+             "watched": bool(fields["watched"]), "fingerprint": record_fingerprint(fields)}
+            for fields, _ in records
+        ]
+        for row, (_, genres) in zip(base_rows, records):
+            summary.add_movie_counts(deltas, row, genres, 1)
+        movie_ids = db.session.execute(
+            insert(movies_table).returning(movies_table.c.movie_id, sort_by_parameter_order=True), base_rows
+        ).scalars().all()
+
+        if model is not Movie:
+            table = model.__table__
+            key = table.primary_key.columns[0].name
+            db.session.execute(insert(table), [
+                {key: movie_id, **{name: fields[name] for name in fields if name not in base_columns}}
+                for movie_id, (fields, _) in zip(movie_ids, records)
+            ])
+        links.extend(
+            {"movie_id": movie_id, "genre_id": ids[name]}
+            for movie_id, (_, genres) in zip(movie_ids, records) for name in set(genres)
+        )
+
+    if links:
+        db.session.execute(insert(movie_genres), links)
+    summary.apply_deltas(db.session.connection(), deltas)
+
+
+def write_batch(batch, policy):
+    """
+    Applies the duplicate policy to a batch of validated (row number, model, fields, genres) records, then inserts
+    the new movies and updates the existing ones in one transaction. Returns the numbers of movies inserted and
+    updated, and the errors of the refused rows.
+    """
+    inserts, changes, errors = resolve_batch(batch, policy)
+    if changes:
+        update_existing(changes, policy)
+    if inserts:
+        insert_batch([record[1:] for record in inserts])
+    if inserts or changes:
+        CollectionVersion.bump()
+    db.session.commit()
+    return len(inserts), len(changes), errors
+
+
+def bulk_import(records, batch_size=DEFAULT_BATCH_SIZE, policy=DEFAULT_DUPLICATE_POLICY):
+    """
+    Validates and inserts a stream of (line number, record) pairs in batched transactions, applying the duplicate
+    policy to records matching an existing movie or an earlier record. Returns the numbers of movies inserted
+    and of existing movies updated, and a list of {"row", "message"} errors for rejected rows.
+    """
+    inserted = updated = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal inserted, updated
+        try:
+            batch_inserted, batch_updated, batch_errors = write_batch(batch, policy)
+        except Exception as e:
+            # The batch is rolled back as a whole, so each of its rows is reported; earlier batches stay committed
+            db.session.rollback()
+            batch_inserted, batch_updated = 0, 0
+            batch_errors = [{"row": number, "message": str(e)} for number, *_ in batch]
+        inserted += batch_inserted
+        updated += batch_updated
+        errors.extend(batch_errors)
+        batch.clear()
+
+    for number, record in records:
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            batch.append((number, *validate_movie(record)))
+        except Exception as e:
+            errors.append({"row": number, "message": str(e)})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    errors.sort(key=lambda error: error["row"])
+    return inserted, updated, errors
@@ -1,159 +1,173 @@
-from flask import request, jsonify
-from configuration import app, db
-from models import Movie, Documentary, KidMovies
+from flask import Blueprint, request, jsonify, Response, send_file, stream_with_context
+from configuration import create_app, db
+from models import Movie, Documentary, KidMovies, Genre, CollectionVersion
+from filters import build_search_filters
+from queries import parse_search, movies_statement, movie_results, projection_statement, projected_results, search_page
+from ingest import validate_movie, bulk_import, parse_duplicate_policy, resolve_duplicate, DuplicateMovie, READERS, DEFAULT_BATCH_SIZE
+from export import iter_movies, FORMATS
+from batch import select_ids, validate_patch, apply_patch, delete_movies
+from cache import cached_response, conditional_response, get_cache
+from stats import collection_stats, AGGREGATIONS, DEFAULT_DURATION_BUCKET
+from replicas import read_only, add_version_header
+from serialize import page_response, search_formats
+from negotiation import negotiated, current_representation
+import metrics
+import profiling
+from schema import upgrade_database
 import json
 
+# The API routes, registered on each app built by configuration.create_app
+api = Blueprint("api", __name__)
+
+# Writes tell the client the collection version to require of its next reads
+api.after_request(add_version_header)
+
+# Every request's latency, SQL, rows, serialization time and size go to /metrics and Server-Timing
+api.before_request(metrics.start_request)
+api.after_request(metrics.record_response)
+
+# Sampled or token-requested requests are profiled after the metrics start, and saved before they are recorded
+api.before_request(profiling.start_profile)
+api.after_request(profiling.finish_profile)
+api.teardown_request(profiling.abandon_profile)
+
+
 # Endpoint to search movies in the database with optional filters
-@app.route("/search_movies", methods=["GET"])
+@api.route("/search_movies", methods=["GET"])
+@read_only
+@negotiated(search_formats())
+@conditional_response
+@cached_response
 def search_movies():
-    # Extract query parameters for filtering
-    title = request.args.get("title")
-    director = request.args.get("director")
-    genre = request.args.get("genre")
-    age_rating = request.args.get("age_rating")
-    favourite = request.args.get("favourite")
-    watched = request.args.get("watched")
-    release_year = request.args.get("release_year")
-    duration = request.args.get("duration")
-    movie_type = request.args.get("type")
-    is_animated = request.args.get("is_animated")
-    topic = request.args.get("topic")
-    documentarian = request.args.get("documentarian")
-    moral_lesson = request.args.get("moral_lesson")
-    parental_appeal = request.args.get("parental_appeal")
-
-    # Build the SQLAlchemy query based on provided filters
-    query = Movie.query
-    if title:
-        query = query.filter(Movie.title.ilike(f"%{title}%"))
-    if topic:
-        query = query.filter(Movie.topic.ilike(f"%{topic}%"))
-    if documentarian:
-        query = query.filter(Movie.documentarian.ilike(f"%{documentarian}%"))
-    if moral_lesson:
-        query = query.filter(Movie.moral_lesson.ilike(f"%{moral_lesson}%"))
-    if director:
-        query = query.filter(Movie.director.ilike(f"%{director}%"))
-    if genre:
-        query = query.filter(Movie.genre.contains(f'"{genre}"'))
-    if age_rating:
-        try:
-            query = query.filter(Movie.age_rating == int(age_rating))
-        except ValueError:
-            return jsonify({"message": "Invalid age rating format"}), 400
-    if watched is not None and watched != "":
-        query = query.filter(Movie.watched == (watched.lower() == "true"))
-
-    if favourite is not None and favourite != "":
-        query = query.filter(Movie.favourite == (favourite.lower() == "true"))
-
-    if is_animated is not None and is_animated != "":
-        query = query.filter(Movie.is_animated == (is_animated.lower() == "true"))
-
-    if release_year:
-        try:
-            query = query.filter(Movie.release_year <= int(release_year))
-        except ValueError:
-            return jsonify({"message": "Invalid release year format"}), 400
-    if duration:
-        try:
-            query = query.filter(Movie.duration <= int(duration))
-        except ValueError:
-            return jsonify({"message": "Invalid duration format"}), 400
-    if movie_type and movie_type.lower() != "all":
-        query = query.filter(Movie.type.ilike(f"{movie_type}"))
-    if parental_appeal:
-        try:
-            query = query.filter(Movie.parental_appeal <= int(parental_appeal))
-        except ValueError:
-            return jsonify({"message": "Invalid parental appeal format"}), 400
-    
-    # Execute the query and return results
-    movies = query.all()
-    json_movies = [movie.to_json() for movie in movies if movie is not None]
-    return jsonify({"movies": json_movies})
+    # Build the filter expressions and pagination settings from the query parameters
+    try:
+        filters, ranked, limit, fields = parse_search(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Fetch one extra row to know whether another page follows
+    if fields:
+        statement, owners = projection_statement(fields, filters, ranked, limit + 1)
+        rows = db.session.execute(statement).all()
+        genres = Genre.names_by_movie([row.movie_id for row in rows]) if "genre" in owners else {}
+        results = projected_results(rows, owners, genres, ranked)
+    else:
+        rows = db.session.execute(movies_statement(filters, ranked, limit + 1)).all()
+        results = movie_results(rows, Genre.names_by_movie([row.movieId for row in rows]), ranked)
+    return page_response(search_page(results, limit, ranked), current_representation().media_type)
+
+
+# Endpoint to aggregate the movies matching the search filters in SQL, for charts and dashboards
+@api.route("/stats", methods=["GET"])
+@read_only
+@negotiated()
+@conditional_response
+@cached_response
+def movie_stats():
+    try:
+        filters = build_search_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # include= limits the response to the named aggregations, e.g. include=releaseYear for the year chart
+    include = [name.strip() for name in request.args.get("include", "").split(",") if name.strip()]
+    unknown = [name for name in include if name not in AGGREGATIONS]
+    if unknown:
+        return jsonify({"message": f"Unknown aggregations: {', '.join(unknown)}"}), 400
+    try:
+        duration_bucket = int(request.args.get("duration_bucket", DEFAULT_DURATION_BUCKET))
+        if duration_bucket < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"message": "Invalid duration bucket format"}), 400
+
+    return jsonify(collection_stats(filters, include, duration_bucket))
+
+
+# Endpoint to stream every movie matching the search filters as NDJSON or CSV, without paging
+@api.route("/export", methods=["GET"])
+@read_only
+@conditional_response
+def export_movies():
+    data_format = request.args.get("format", "ndjson")
+    if data_format not in FORMATS:
+        return jsonify({"message": "Invalid export format, expected 'ndjson' or 'csv'"}), 400
+    try:
+        filters = build_search_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Rows are read, encoded and sent in batches as the client consumes the response
+    encode, mimetype = FORMATS[data_format]
+    return Response(
+        stream_with_context(encode(iter_movies(filters))),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=movies.{data_format}"}
+    )
 
 
 # Endpoint to add new movies or documentaries to the database
-@app.route("/add_movies", methods=["POST"])
+# ?on_duplicate=reject|upsert|merge decides what happens when the movie matches an existing one
+@api.route("/add_movies", methods=["POST"])
 def add_movie():
-    # Parse input data from request
-    data = request.json
-    title = data.get("title")
-    director = data.get("director")
-    genre = data.get("genre")
-    release_year = data.get("releaseYear")
-    duration = data.get("duration")
-    favourite = data.get("favourite")
-    is_animated = data.get("isAnimated")
-    watched = data.get("watched")
-    age_rating = data.get("ageRating")
-    movie_type = data.get("type")
-    topic = data.get("topic")
-    documentarian = data.get("documentarian")
-    moral_lesson = data.get("moralLesson")
-    parental_appeal = data.get("parentalAppeal")
-
-    # Validate required fields for all movie types
-    if not title or not director or not release_year or not duration or not age_rating or not genre:
-        return jsonify({"message": "Missing required fields"}), 400
-
-    # Determine movie type and create the appropriate database record
-    if movie_type == "documentary":
-        if not topic or not documentarian:
-            return jsonify({"message": "Documentary must include topic and documentarian"}), 400
-        new_movie = Documentary(
-            title=title,
-            director=director,
-            release_year=release_year,
-            duration=duration,
-            favourite=favourite,
-            is_animated=is_animated,
-            watched=watched,
-            age_rating=age_rating,
-            topic=topic,
-            documentarian=documentarian
-        )
-    elif movie_type == "kidMovie":
-        if not moral_lesson or not parental_appeal:
-            return jsonify({"message": "Kids Movie must include moral lesson and parental appeal"}), 400
-        new_movie = KidMovies(
-            title=title,
-            director=director,
-            release_year=release_year,
-            duration=duration,
-            favourite=favourite,
-            is_animated=is_animated,
-            watched=watched,
-            age_rating=age_rating,
-            moral_lesson=moral_lesson,
-            parental_appeal=parental_appeal
-        )
-    else:
-        new_movie = Movie(
-            title=title,
-            director=director,
-            release_year=release_year,
-            duration=duration,
-            favourite=favourite,
-            is_animated=is_animated,
-            watched=watched,
-            age_rating=age_rating
-        )
-    # Set genres and save the movie to the database
+    # Validate the request and create the appropriate database record for its movie type
+    try:
+        policy = parse_duplicate_policy(request.args.get("on_duplicate"))
+        model, fields, genre = validate_movie(request.json)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Update the movie it duplicates, or set genres and save it as a new movie
     try:
-        new_movie.set_genres(genre)
-        db.session.add(new_movie)
+        existing_id = resolve_duplicate(model, fields, genre, policy)
+        if existing_id is None:
+            new_movie = model(**fields)
+            new_movie.set_genres(genre)
+            db.session.add(new_movie)
+        CollectionVersion.bump()
         db.session.commit()
+    except DuplicateMovie as e:
+        db.session.rollback()
+        return jsonify({"message": str(e), "movieId": e.movie_id}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+
+    if existing_id is not None:
+        return jsonify({"message": "Existing movie updated", "movieId": existing_id}), 200
+    return jsonify({"message": "Movie/Documentary Added", "movieId": new_movie.movie_id}), 201
+
+
+# Endpoint to add many movies from an NDJSON or CSV request body, streamed and inserted in batches
+@api.route("/bulk_add_movies", methods=["POST"])
+def bulk_add_movies():
+    # The format comes from ?format= or the Content-Type header
+    content_type = request.mimetype or ""
+    data_format = request.args.get("format") or ("csv" if content_type == "text/csv" else "ndjson" if "ndjson" in content_type else None)
+    if data_format not in READERS:
+        return jsonify({"message": "Body must be NDJSON (application/x-ndjson) or CSV (text/csv)"}), 415
+    try:
+        batch_size = int(request.args.get("batch_size", DEFAULT_BATCH_SIZE))
+    except ValueError:
+        return jsonify({"message": "Invalid batch size format"}), 400
+    try:
+        policy = parse_duplicate_policy(request.args.get("on_duplicate"))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        inserted, updated, errors = bulk_import(READERS[data_format](request.stream), max(1, batch_size), policy)
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": str(e)}), 400
 
-    return jsonify({"message": "Movie/Documentary Added"}), 201
+    body = {"message": f"{inserted} movies added, {updated} updated", "inserted": inserted, "updated": updated,
+            "errors": errors}
+    return jsonify(body), 201 if inserted else 200 if updated else 400
 
 
 # Endpoint to update an existing movie record by ID
-@app.route("/update_movie/<int:movie_id>", methods=["PATCH"])
+@api.route("/update_movie/<int:movie_id>", methods=["PATCH"])
 def update_movie(movie_id):
     movie = Movie.query.get(movie_id)
 
@@ -197,12 +211,13 @@ def update_movie(movie_id):
     if "favourite" in data:
         movie.favourite = data.get("favourite", movie.favourite)
 
+    CollectionVersion.bump()
     db.session.commit()
     return jsonify({"message": "Movie updated successfully"}), 200
 
 
 # Endpoint to delete a movie by ID
-@app.route("/delete_movie/<int:id>", methods=["DELETE"])
+@api.route("/delete_movie/<int:id>", methods=["DELETE"])
 def delete_movie(id):
     movie = Movie.query.get(id)
     
@@ -211,13 +226,92 @@ def delete_movie(id):
     
     # Remove the movie from the database
     db.session.delete(movie)
+    CollectionVersion.bump()
     db.session.commit()
     return jsonify({"message": "Movie deleted"}), 200
 
 
+# Endpoint to apply one patch to many movies, selected by {"ids": [...]} or {"filter": {search parameters}}
+@api.route("/movies/batch", methods=["PATCH"])
+def batch_update_movies():
+    data = request.json
+    try:
+        validate_patch(data.get("patch") if isinstance(data, dict) else None)
+        ids = select_ids(data)
+        apply_patch(ids, data["patch"])
+        CollectionVersion.bump()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({"message": f"{len(ids)} movies updated", "updated": len(ids)}), 200
+
+
+# Endpoint to delete many movies, selected by {"ids": [...]} or {"filter": {search parameters}}
+@api.route("/movies/batch", methods=["DELETE"])
+def batch_delete_movies():
+    try:
+        ids = select_ids(request.json)
+        delete_movies(ids)
+        CollectionVersion.bump()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({"message": f"{len(ids)} movies deleted", "deleted": len(ids)}), 200
+
+
+# Endpoint exposing this process's request metrics in Prometheus text format
+@api.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Endpoint listing the saved request profiles, newest first
+@api.route("/admin/profiles", methods=["GET"])
+def list_profiles():
+    if not profiling.admin_allowed():
+        return jsonify({"message": "Profiling token required"}), 403
+    return jsonify({"profiles": profiling.list_summaries()})
+
+
+# Endpoint returning a saved profile's SQL statements and hottest functions
+@api.route("/admin/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    if not profiling.admin_allowed():
+        return jsonify({"message": "Profiling token required"}), 403
+    summary = profiling.load_summary(profile_id)
+    if summary is None:
+        return jsonify({"message": "Profile not found"}), 404
+    return jsonify(summary)
+
+
+# Endpoint downloading a saved profile's pstats dump, for snakeviz, flameprof or pstats
+@api.route("/admin/profiles/<profile_id>/pstats", methods=["GET"])
+def get_profile_stats(profile_id):
+    if not profiling.admin_allowed():
+        return jsonify({"message": "Profiling token required"}), 403
+    path = profiling.profile_path(profile_id, ".prof")
+    if path is None:
+        return jsonify({"message": "Profile not found"}), 404
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=f"{profile_id}.prof")
+
+
+# Endpoint reporting this process's search cache hit and miss counters
+@api.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return jsonify({"message": "Search cache is disabled"}), 404
+    return jsonify(cache.metrics())
+
+
 if __name__ == '__main__':
-    # Initialize the database and start the server
+    # Bring the database schema up to date and start the development server; see `flask --app main serve`
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade_database()
 
     app.run(debug=True)
@@ -0,0 +1,219 @@
+"""
+Request instrumentation. Every API request records its latency, the number and time of its SQL statements, the
+rows it returned and wrote, its serialization time and its response size. The totals are exposed per endpoint
+in Prometheus text format on /metrics, and each response carries its own figures in a Server-Timing header.
+Statements slower than SLOW_QUERY_MS are logged with their parameters.
+
+Like the response cache counters, the registry is kept per process: with several server workers, each scrape
+of /metrics reads the worker that answers it.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Statements at least this slow are logged, in milliseconds
+DEFAULT_SLOW_QUERY_MS = 250
+
+# Upper bounds of the histogram buckets, in seconds and in bytes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Longest statement text and parameter list written to the slow query log
+LOG_TEXT_LIMIT = 1000
+
+# The figures of the request being handled; set per thread by Flask and per task by the async path
+current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Figures gathered while one request is handled."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows_returned = 0
+        self.rows_written = 0
+        self.serialize_seconds = 0.0
+        # Every SQL statement with its parameters and timings, only listed while the request is profiled
+        self.statements = None
+
+    def elapsed(self):
+        """Seconds since the request started."""
+        return time.perf_counter() - self.started
+
+
+class Histogram:
+    """Cumulative Prometheus histogram of one labelled series."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """This process's metrics: counters and histograms keyed by metric name and label values."""
+
+    # Metric name: (type, help text), in exposition order
+    METRICS = {
+        "app_request_duration_seconds": ("histogram", "Time spent handling requests."),
+        "app_response_size_bytes": ("histogram", "Size of response bodies, after compression."),
+        "app_db_queries_total": ("counter", "SQL statements executed while handling requests."),
+        "app_db_query_seconds_total": ("counter", "Time spent executing SQL statements while handling requests."),
+        "app_rows_returned_total": ("counter", "Movies serialized into search pages."),
+        "app_rows_written_total": ("counter", "Rows inserted, updated or deleted while handling requests."),
+        "app_serialize_seconds_total": ("counter", "Time spent encoding response bodies."),
+        "app_slow_queries_total": ("counter", "SQL statements slower than the slow query threshold.")
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {name: {} for name in self.METRICS}
+
+    def increment(self, name, labels, amount=1):
+        with self.lock:
+            series = self.series[name]
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        with self.lock:
+            series = self.series[name]
+            if labels not in series:
+                series[labels] = Histogram(buckets)
+            series[labels].observe(value)
+
+    def render(self):
+        """The metrics in Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in self.METRICS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                for labels, value in sorted(self.series[name].items()):
+                    if kind == "counter":
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                        continue
+                    for bound, count in zip(value.buckets, value.counts):
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {value.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def format_labels(labels):
+    """Formats (name, value) pairs as a Prometheus label set, escaping the values."""
+    if not labels:
+        return ""
+    escape = lambda value: value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def start_request():
+    """Starts gathering figures for a new request."""
+    current.set(RequestMetrics())
+
+
+def finish_request(endpoint, method, status, size):
+    """
+    Adds the current request's figures to the registry under its endpoint and returns its Server-Timing value,
+    or None when no request was started. `size` is None for streamed bodies, whose size is not known yet.
+    """
+    request_metrics = current.get()
+    if request_metrics is None:
+        return None
+    current.set(None)
+    elapsed = request_metrics.elapsed()
+    labels = (("endpoint", endpoint), ("method", method))
+    registry.observe("app_request_duration_seconds", labels + (("status", str(status)),), elapsed, LATENCY_BUCKETS)
+    if size is not None:
+        registry.observe("app_response_size_bytes", labels, size, SIZE_BUCKETS)
+    registry.increment("app_db_queries_total", labels, request_metrics.queries)
+    registry.increment("app_db_query_seconds_total", labels, request_metrics.query_seconds)
+    registry.increment("app_rows_returned_total", labels, request_metrics.rows_returned)
+    registry.increment("app_rows_written_total", labels, request_metrics.rows_written)
+    registry.increment("app_serialize_seconds_total", labels, request_metrics.serialize_seconds)
+    return (
+        f'db;dur={request_metrics.query_seconds * 1000:.2f};desc="{request_metrics.queries} queries", '
+        f"serialize;dur={request_metrics.serialize_seconds * 1000:.2f}, "
+        f"total;dur={elapsed * 1000:.2f}"
+    )
+
+
+def record_response(response):
+    """Flask after_request hook recording the request's figures and adding its Server-Timing header."""
+    timing = finish_request(
+        request.url_rule.rule if request.url_rule else request.path, request.method, response.status_code,
+        None if response.is_streamed else response.calculate_content_length()
+    )
+    if timing is not None:
+        response.headers["Server-Timing"] = timing
+    return response
+
+
+@contextmanager
+def serializing(rows):
+    """Times the encoding of a response body holding `rows` movies, for the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics = current.get()
+        if request_metrics is not None:
+            request_metrics.serialize_seconds += time.perf_counter() - started
+            request_metrics.rows_returned += rows
+
+
+def instrument_engine(engine, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+    """Counts and times every statement the engine executes, and logs the ones slower than `slow_query_ms`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def finish_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        request_metrics = current.get()
+        if request_metrics is not None:
+            request_metrics.queries += 1
+            request_metrics.query_seconds += elapsed
+            if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+                request_metrics.rows_written += max(cursor.rowcount, 0)
+            if request_metrics.statements is not None:
+                request_metrics.statements.append({
+                    "statement": statement,
+                    "parameters": repr(parameters)[:LOG_TEXT_LIMIT],
+                    "started_ms": round((time.perf_counter() - elapsed - request_metrics.started) * 1000, 3),
+                    "duration_ms": round(elapsed * 1000, 3)
+                })
+        if elapsed * 1000 >= slow_query_ms:
+            registry.increment("app_slow_queries_total", ())
+            logger.warning(
+                "Slow query (%.1f ms): %s; parameters: %s",
+                elapsed * 1000, statement[:LOG_TEXT_LIMIT], repr(parameters)[:LOG_TEXT_LIMIT]
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def abandon_query(exception_context):
+        # A failed statement never reaches after_cursor_execute, so its start time is dropped here
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
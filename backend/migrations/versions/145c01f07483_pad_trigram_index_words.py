@@ -0,0 +1,106 @@
+"""pad the words of the trigram index as pg_trgm does
+
+Revision ID: 145c01f07483
+Revises: 5b29b330b1f3
+Create Date: 2026-10-18 17:41:05.218334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '145c01f07483'
+down_revision = '5b29b330b1f3'
+branch_labels = None
+depends_on = None
+
+
+# Punctuation pg_trgm splits words on, written as spaces in the index. Characters outside this list still join
+# the words beside them, so those words miss their first and last trigrams in the prefilter.
+SEPARATORS = "-:.,;!?&/()[]'\"_"
+
+
+def padded(value):
+    """
+    The SQL expression of a column value as the trigram index holds it: its punctuation turned into spaces and a
+    space added at each end, so every word has the ' ab' and 'yz ' trigrams pg_trgm pads it with.
+    """
+    for separator in SEPARATORS:
+        value = f"replace({value}, '{separator.replace(chr(39), chr(39) * 2)}', ' ')"
+    return f"' ' || {value} || ' '"
+
+
+def raw(value):
+    return value
+
+
+# The trigger bodies of the trigram index migration, with the indexed text given by the function passed in
+def triggers(text):
+    return {
+        'movie_search_trigrams_movies_insert': f"""
+            CREATE TRIGGER movie_search_trigrams_movies_insert AFTER INSERT ON movies BEGIN
+                INSERT INTO movie_search_trigrams (rowid, title, director)
+                VALUES (new.movie_id, {text('new.title')}, {text('new.director')});
+            END
+        """,
+        'movie_search_trigrams_movies_update': f"""
+            CREATE TRIGGER movie_search_trigrams_movies_update AFTER UPDATE OF title, director ON movies BEGIN
+                UPDATE movie_search_trigrams SET title = {text('new.title')}, director = {text('new.director')}
+                WHERE rowid = new.movie_id;
+            END
+        """,
+        'movie_search_trigrams_movies_delete': """
+            CREATE TRIGGER movie_search_trigrams_movies_delete AFTER DELETE ON movies BEGIN
+                DELETE FROM movie_search_trigrams WHERE rowid = old.movie_id;
+            END
+        """,
+        'movie_search_trigrams_documentaries_insert': f"""
+            CREATE TRIGGER movie_search_trigrams_documentaries_insert AFTER INSERT ON documentaries BEGIN
+                UPDATE movie_search_trigrams SET documentarian = {text('new.documentarian')}
+                WHERE rowid = new.documentary_id;
+            END
+        """,
+        'movie_search_trigrams_documentaries_update': f"""
+            CREATE TRIGGER movie_search_trigrams_documentaries_update AFTER UPDATE OF documentarian ON documentaries BEGIN
+                UPDATE movie_search_trigrams SET documentarian = {text('new.documentarian')}
+                WHERE rowid = new.documentary_id;
+            END
+        """,
+        'movie_search_trigrams_documentaries_delete': """
+            CREATE TRIGGER movie_search_trigrams_documentaries_delete AFTER DELETE ON documentaries BEGIN
+                UPDATE movie_search_trigrams SET documentarian = NULL WHERE rowid = old.documentary_id;
+            END
+        """
+    }
+
+
+def backfill(text):
+    return f"""
+        INSERT INTO movie_search_trigrams (rowid, title, director, documentarian)
+        SELECT movies.movie_id, {text('movies.title')}, {text('movies.director')}, {text('documentaries.documentarian')}
+        FROM movies
+        LEFT OUTER JOIN documentaries ON documentaries.documentary_id = movies.movie_id
+    """
+
+
+def rebuild(text):
+    for name in triggers(text):
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DELETE FROM movie_search_trigrams')
+    op.execute(backfill(text))
+    for statement in triggers(text).values():
+        op.execute(statement)
+
+
+def upgrade():
+    # PostgreSQL databases pad words themselves in pg_trgm
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild(padded)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild(raw)
@@ -0,0 +1,56 @@
+"""movie fingerprints for duplicate detection
+
+Revision ID: 4334a444d6f2
+Revises: f08a7c9113d8
+Create Date: 2026-10-18 12:31:40.518207
+
+"""
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4334a444d6f2'
+down_revision = 'f08a7c9113d8'
+branch_labels = None
+depends_on = None
+
+# Movies fingerprinted per UPDATE executemany while backfilling
+BACKFILL_BATCH_SIZE = 5000
+
+
+def fingerprint(title, director, release_year):
+    """models.movie_fingerprint as of this revision, copied so the migration keeps working if it changes."""
+    if not title or not director or release_year is None:
+        return None
+    normalize = lambda text: " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+    return f"{normalize(title)}\x1f{normalize(director)}\x1f{release_year}"
+
+
+def upgrade():
+    # Adding a nullable column does not rebuild the table, which would drop the full-text index triggers
+    with op.batch_alter_table('movies', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.Text(), nullable=True))
+
+    movies = sa.table('movies', sa.column('movie_id', sa.Integer), sa.column('title', sa.String),
+                      sa.column('director', sa.String), sa.column('release_year', sa.Integer),
+                      sa.column('fingerprint', sa.Text))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(movies.c.movie_id, movies.c.title, movies.c.director, movies.c.release_year)).all()
+    statement = movies.update().where(movies.c.movie_id == sa.bindparam('id')).values(fingerprint=sa.bindparam('print'))
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        connection.execute(statement, [
+            {'id': movie_id, 'print': fingerprint(title, director, release_year)}
+            for movie_id, title, director, release_year in rows[start:start + BACKFILL_BATCH_SIZE]
+        ])
+
+    # Built after the backfill, so it is written once rather than updated row by row
+    with op.batch_alter_table('movies', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_movies_fingerprint'), ['fingerprint'], unique=False)
+
+
+def downgrade():
+    # Dropped in place rather than in batch mode, which would rebuild the table without its triggers
+    op.drop_index(op.f('ix_movies_fingerprint'), table_name='movies')
+    op.drop_column('movies', 'fingerprint')
@@ -0,0 +1,27 @@
+"""case-insensitive genre name index
+
+Revision ID: 5b29b330b1f3
+Revises: 8fc1aea094df
+Create Date: 2026-10-18 16:20:37.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b29b330b1f3'
+down_revision = '8fc1aea094df'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Genre filters compare lower(name), which the unique index on name cannot answer
+    with op.batch_alter_table('genres', schema=None) as batch_op:
+        batch_op.create_index('ix_genres_lower_name', [sa.text('lower(name)')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('genres', schema=None) as batch_op:
+        batch_op.drop_index('ix_genres_lower_name')
@@ -0,0 +1,86 @@
+"""trigram index for fuzzy search on SQLite
+
+Revision ID: 8fc1aea094df
+Revises: 4334a444d6f2
+Create Date: 2026-10-18 14:02:11.635904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8fc1aea094df'
+down_revision = '4334a444d6f2'
+branch_labels = None
+depends_on = None
+
+
+# Every three-character substring of the fuzzy-searched columns, one row per movie with rowid = movie_id. Only
+# single trigrams are queried, so column-level detail is enough and keeps the index small.
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE movie_search_trigrams USING fts5(
+    title, director, documentarian,
+    tokenize = 'trigram',
+    detail = column
+)
+"""
+
+# Triggers keeping the index in step with movies and documentaries, like those of the movie_search index
+TRIGGERS = {
+    'movie_search_trigrams_movies_insert': """
+        CREATE TRIGGER movie_search_trigrams_movies_insert AFTER INSERT ON movies BEGIN
+            INSERT INTO movie_search_trigrams (rowid, title, director) VALUES (new.movie_id, new.title, new.director);
+        END
+    """,
+    'movie_search_trigrams_movies_update': """
+        CREATE TRIGGER movie_search_trigrams_movies_update AFTER UPDATE OF title, director ON movies BEGIN
+            UPDATE movie_search_trigrams SET title = new.title, director = new.director WHERE rowid = new.movie_id;
+        END
+    """,
+    'movie_search_trigrams_movies_delete': """
+        CREATE TRIGGER movie_search_trigrams_movies_delete AFTER DELETE ON movies BEGIN
+            DELETE FROM movie_search_trigrams WHERE rowid = old.movie_id;
+        END
+    """,
+    'movie_search_trigrams_documentaries_insert': """
+        CREATE TRIGGER movie_search_trigrams_documentaries_insert AFTER INSERT ON documentaries BEGIN
+            UPDATE movie_search_trigrams SET documentarian = new.documentarian WHERE rowid = new.documentary_id;
+        END
+    """,
+    'movie_search_trigrams_documentaries_update': """
+        CREATE TRIGGER movie_search_trigrams_documentaries_update AFTER UPDATE OF documentarian ON documentaries BEGIN
+            UPDATE movie_search_trigrams SET documentarian = new.documentarian WHERE rowid = new.documentary_id;
+        END
+    """,
+    'movie_search_trigrams_documentaries_delete': """
+        CREATE TRIGGER movie_search_trigrams_documentaries_delete AFTER DELETE ON documentaries BEGIN
+            UPDATE movie_search_trigrams SET documentarian = NULL WHERE rowid = old.documentary_id;
+        END
+    """
+}
+
+BACKFILL = """
+INSERT INTO movie_search_trigrams (rowid, title, director, documentarian)
+SELECT movies.movie_id, movies.title, movies.director, documentaries.documentarian
+FROM movies
+LEFT OUTER JOIN documentaries ON documentaries.documentary_id = movies.movie_id
+"""
+
+
+def upgrade():
+    # PostgreSQL databases match trigrams through the pg_trgm indexes on the same columns
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(CREATE_INDEX)
+    op.execute(BACKFILL)
+    for statement in TRIGGERS.values():
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DROP TABLE IF EXISTS movie_search_trigrams')
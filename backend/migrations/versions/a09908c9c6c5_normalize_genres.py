@@ -0,0 +1,96 @@
+"""normalize genres into genres and movie_genres tables
+
+Revision ID: a09908c9c6c5
+Revises: 2d356bfda2e5
+Create Date: 2026-10-18 09:04:12.518204
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a09908c9c6c5'
+down_revision = '2d356bfda2e5'
+branch_labels = None
+depends_on = None
+
+
+def parse_genres(value):
+    """Deserializes the legacy JSON genre column, treating missing or invalid data as no genres."""
+    if not value:
+        return []
+    try:
+        genres = json.loads(value)
+    except json.JSONDecodeError:
+        return []
+    return [genre for genre in genres if isinstance(genre, str)]
+
+
+def upgrade():
+    genres = op.create_table('genres',
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=80), nullable=False),
+    sa.PrimaryKeyConstraint('genre_id')
+    )
+    with op.batch_alter_table('genres', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_genres_name'), ['name'], unique=True)
+
+    movie_genres = op.create_table('movie_genres',
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['genres.genre_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.movie_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id', 'genre_id')
+    )
+    with op.batch_alter_table('movie_genres', schema=None) as batch_op:
+        batch_op.create_index('ix_movie_genres_genre_id_movie_id', ['genre_id', 'movie_id'], unique=False)
+
+    # Backfill the new tables from the JSON lists stored on each movie
+    connection = op.get_bind()
+    movies = sa.table('movies', sa.column('movie_id', sa.Integer), sa.column('genre', sa.Text))
+    genre_ids = {}
+    links = []
+    for movie_id, value in connection.execute(sa.select(movies.c.movie_id, movies.c.genre)):
+        for name in set(parse_genres(value)):
+            if name not in genre_ids:
+                genre_ids[name] = len(genre_ids) + 1
+            links.append({'movie_id': movie_id, 'genre_id': genre_ids[name]})
+    if genre_ids:
+        op.bulk_insert(genres, [{'genre_id': genre_id, 'name': name} for name, genre_id in genre_ids.items()])
+    if links:
+        op.bulk_insert(movie_genres, links)
+
+    with op.batch_alter_table('movies', schema=None) as batch_op:
+        batch_op.drop_column('genre')
+
+
+def downgrade():
+    with op.batch_alter_table('movies', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('genre', sa.Text(), nullable=False, server_default='[]'))
+
+    # Serialize each movie's genres back into the JSON column
+    connection = op.get_bind()
+    movies = sa.table('movies', sa.column('movie_id', sa.Integer), sa.column('genre', sa.Text))
+    rows = connection.execute(sa.text(
+        'SELECT movie_genres.movie_id, genres.name FROM movie_genres '
+        'JOIN genres ON genres.genre_id = movie_genres.genre_id'
+    ))
+    names = {}
+    for movie_id, name in rows:
+        names.setdefault(movie_id, []).append(name)
+    for movie_id, genre_names in names.items():
+        connection.execute(
+            movies.update().where(movies.c.movie_id == movie_id).values(genre=json.dumps(genre_names))
+        )
+
+    with op.batch_alter_table('movie_genres', schema=None) as batch_op:
+        batch_op.drop_index('ix_movie_genres_genre_id_movie_id')
+
+    op.drop_table('movie_genres')
+    with op.batch_alter_table('genres', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_genres_name'))
+
+    op.drop_table('genres')
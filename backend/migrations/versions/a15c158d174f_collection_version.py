@@ -0,0 +1,30 @@
+"""collection version counter for response caching
+
+Revision ID: a15c158d174f
+Revises: 2f613bb8718e
+Create Date: 2026-10-18 10:12:36.480117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a15c158d174f'
+down_revision = '2f613bb8718e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    collection_version = op.create_table('collection_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # The counter is a single row that writes increment
+    op.bulk_insert(collection_version, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('collection_version')
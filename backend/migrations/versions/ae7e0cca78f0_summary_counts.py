@@ -0,0 +1,49 @@
+"""summary table of collection statistics
+
+Revision ID: ae7e0cca78f0
+Revises: a15c158d174f
+Create Date: 2026-10-18 11:02:14.218305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ae7e0cca78f0'
+down_revision = 'a15c158d174f'
+branch_labels = None
+depends_on = None
+
+# Per-movie sums shared by every backfilled dimension
+COUNTS = (
+    "COUNT(*), COALESCE(SUM(CASE WHEN m.watched THEN 1 ELSE 0 END), 0), "
+    "COALESCE(SUM(CASE WHEN m.favourite THEN 1 ELSE 0 END), 0)"
+)
+
+
+def upgrade():
+    op.create_table('summary_counts',
+    sa.Column('dimension', sa.String(length=20), nullable=False),
+    sa.Column('bucket', sa.String(length=80), nullable=False),
+    sa.Column('movies', sa.Integer(), nullable=False),
+    sa.Column('watched', sa.Integer(), nullable=False),
+    sa.Column('favourite', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dimension', 'bucket')
+    )
+    # Backfill every dimension from the existing movies; the application keeps them current from here on
+    insert = "INSERT INTO summary_counts (dimension, bucket, movies, watched, favourite) "
+    op.execute(insert + f"SELECT 'all', '', {COUNTS} FROM movies m")
+    for dimension, column in (('releaseYear', 'release_year'), ('type', 'type'), ('ageRating', 'age_rating')):
+        op.execute(
+            insert + f"SELECT '{dimension}', CAST(m.{column} AS VARCHAR(80)), {COUNTS} "
+            f"FROM movies m GROUP BY m.{column}"
+        )
+    op.execute(
+        insert + f"SELECT 'genre', g.name, {COUNTS} FROM movies m "
+        "JOIN movie_genres mg ON mg.movie_id = m.movie_id JOIN genres g ON g.genre_id = mg.genre_id GROUP BY g.name"
+    )
+
+
+def downgrade():
+    op.drop_table('summary_counts')
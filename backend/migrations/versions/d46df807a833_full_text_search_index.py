@@ -0,0 +1,106 @@
+"""full-text search index over movie text fields
+
+Revision ID: d46df807a833
+Revises: a09908c9c6c5
+Create Date: 2026-10-18 09:31:47.204815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd46df807a833'
+down_revision = 'a09908c9c6c5'
+branch_labels = None
+depends_on = None
+
+
+# The index stores one row per movie with rowid = movie_id. Prefix indexes on 2 and 3
+# characters keep short prefix queries from scanning the whole term list.
+CREATE_INDEX = """
+CREATE VIRTUAL TABLE movie_search USING fts5(
+    title, director, topic, documentarian, moral_lesson,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+# Triggers keeping the index in step with the three tables of the movie hierarchy. Subclass
+# rows are written after their movies row, so they fill in the columns of an existing entry.
+TRIGGERS = {
+    'movie_search_movies_insert': """
+        CREATE TRIGGER movie_search_movies_insert AFTER INSERT ON movies BEGIN
+            INSERT INTO movie_search (rowid, title, director) VALUES (new.movie_id, new.title, new.director);
+        END
+    """,
+    'movie_search_movies_update': """
+        CREATE TRIGGER movie_search_movies_update AFTER UPDATE OF title, director ON movies BEGIN
+            UPDATE movie_search SET title = new.title, director = new.director WHERE rowid = new.movie_id;
+        END
+    """,
+    'movie_search_movies_delete': """
+        CREATE TRIGGER movie_search_movies_delete AFTER DELETE ON movies BEGIN
+            DELETE FROM movie_search WHERE rowid = old.movie_id;
+        END
+    """,
+    'movie_search_documentaries_insert': """
+        CREATE TRIGGER movie_search_documentaries_insert AFTER INSERT ON documentaries BEGIN
+            UPDATE movie_search SET topic = new.topic, documentarian = new.documentarian
+            WHERE rowid = new.documentary_id;
+        END
+    """,
+    'movie_search_documentaries_update': """
+        CREATE TRIGGER movie_search_documentaries_update AFTER UPDATE OF topic, documentarian ON documentaries BEGIN
+            UPDATE movie_search SET topic = new.topic, documentarian = new.documentarian
+            WHERE rowid = new.documentary_id;
+        END
+    """,
+    'movie_search_documentaries_delete': """
+        CREATE TRIGGER movie_search_documentaries_delete AFTER DELETE ON documentaries BEGIN
+            UPDATE movie_search SET topic = NULL, documentarian = NULL WHERE rowid = old.documentary_id;
+        END
+    """,
+    'movie_search_kid_movies_insert': """
+        CREATE TRIGGER movie_search_kid_movies_insert AFTER INSERT ON "kidMovies" BEGIN
+            UPDATE movie_search SET moral_lesson = new.moral_lesson WHERE rowid = new.kid_movie_id;
+        END
+    """,
+    'movie_search_kid_movies_update': """
+        CREATE TRIGGER movie_search_kid_movies_update AFTER UPDATE OF moral_lesson ON "kidMovies" BEGIN
+            UPDATE movie_search SET moral_lesson = new.moral_lesson WHERE rowid = new.kid_movie_id;
+        END
+    """,
+    'movie_search_kid_movies_delete': """
+        CREATE TRIGGER movie_search_kid_movies_delete AFTER DELETE ON "kidMovies" BEGIN
+            UPDATE movie_search SET moral_lesson = NULL WHERE rowid = old.kid_movie_id;
+        END
+    """
+}
+
+BACKFILL = """
+INSERT INTO movie_search (rowid, title, director, topic, documentarian, moral_lesson)
+SELECT movies.movie_id, movies.title, movies.director,
+       documentaries.topic, documentaries.documentarian, "kidMovies".moral_lesson
+FROM movies
+LEFT OUTER JOIN documentaries ON documentaries.documentary_id = movies.movie_id
+LEFT OUTER JOIN "kidMovies" ON "kidMovies".kid_movie_id = movies.movie_id
+"""
+
+
+def upgrade():
+    # FTS5 is SQLite's; PostgreSQL databases search the tables through trigram indexes instead
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(CREATE_INDEX)
+    op.execute(BACKFILL)
+    for statement in TRIGGERS.values():
+        op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DROP TABLE IF EXISTS movie_search')
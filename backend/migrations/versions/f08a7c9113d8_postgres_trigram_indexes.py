@@ -0,0 +1,53 @@
+"""trigram indexes for text search on PostgreSQL
+
+Revision ID: f08a7c9113d8
+Revises: ae7e0cca78f0
+Create Date: 2026-10-18 11:48:03.771926
+
+"""
+import logging
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f08a7c9113d8'
+down_revision = 'ae7e0cca78f0'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# GIN trigram indexes answering the case-insensitive word-prefix patterns of search.py, as (table, column)
+TRIGRAM_INDEXES = {
+    'ix_movies_title_trgm': ('movies', 'title'),
+    'ix_movies_director_trgm': ('movies', 'director'),
+    'ix_documentaries_topic_trgm': ('documentaries', 'topic'),
+    'ix_documentaries_documentarian_trgm': ('documentaries', 'documentarian'),
+    'ix_kidMovies_moral_lesson_trgm': ('kidMovies', 'moral_lesson')
+}
+
+
+def upgrade():
+    # SQLite databases search through the FTS5 index instead
+    connection = op.get_bind()
+    if connection.dialect.name != 'postgresql':
+        return
+    available = connection.execute(sa.text(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    )).scalar()
+    if not available:
+        # Searches still work by scanning; once the contrib package is installed, downgrade to the previous
+        # revision and upgrade again to build the indexes
+        logger.warning('pg_trgm is not available, so text searches will not be indexed')
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, (table, column) in TRIGRAM_INDEXES.items():
+        op.create_index(name, table, [column], postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS "{name}"')
@@ -1,5 +1,6 @@
-import json
+import unicodedata
 from configuration import db
+from sqlalchemy import event
 from sqlalchemy.orm import Mapped, mapped_column
 
 class Base(db.Model):
@@ -14,6 +15,133 @@ class Base(db.Model):
         """Provides a string representation of the object for debugging purposes."""
         raise NotImplementedError("Subclasses must implement the `__repr__` method.")
 
+# Association table linking movies to their genres. The (genre_id, movie_id) index serves genre filters.
+movie_genres = db.Table(
+    'movie_genres',
+    db.Column('movie_id', db.Integer, db.ForeignKey('movies.movie_id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.genre_id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_movie_genres_genre_id_movie_id', 'genre_id', 'movie_id')
+)
+
+class Genre(Base):
+    """Represents a single genre name shared by every movie tagged with it."""
+    __tablename__ = 'genres'
+
+    genre_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False, unique=True, index=True)
+
+    def to_json(self):
+        """Converts the genre into its JSON representation, the plain genre name."""
+        return self.name
+
+    def __repr__(self):
+        """Provides a human-readable string representation of the genre."""
+        return f"<Genre {self.name}>"
+
+    @staticmethod
+    def names_statement(movie_ids):
+        """Selects the (movie_id, genre name) pairs of many movies, ordered by name."""
+        return (
+            db.select(movie_genres.c.movie_id, Genre.name)
+            .join(Genre, Genre.genre_id == movie_genres.c.genre_id)
+            .where(movie_genres.c.movie_id.in_(movie_ids))
+            .order_by(Genre.name)
+        )
+
+    @staticmethod
+    def group_names(movie_ids, rows):
+        """Groups the rows of names_statement into sorted genre names keyed by movie_id."""
+        names = {movie_id: [] for movie_id in movie_ids}
+        for movie_id, name in rows:
+            names[movie_id].append(name)
+        return names
+
+    @staticmethod
+    def names_by_movie(movie_ids):
+        """Loads the sorted genre names for many movies in one query, keyed by movie_id."""
+        return Genre.group_names(movie_ids, db.session.execute(Genre.names_statement(movie_ids)))
+
+# Genre filters match names case-insensitively, as the free-text genre search field is typed by hand
+db.Index('ix_genres_lower_name', db.func.lower(Genre.name))
+
+class CollectionVersion(Base):
+    """
+    Single-row counter bumped in the same transaction as every write to the collection.
+    Cached responses are keyed on it, so a bump invalidates them in every worker process.
+    """
+    __tablename__ = 'collection_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def current():
+        """Reads the current collection version."""
+        return db.session.execute(db.select(CollectionVersion.version)).scalar() or 0
+
+    @staticmethod
+    def bump():
+        """
+        Increments the collection version as part of the caller's transaction and returns the new version,
+        also kept in the session's info for the read-your-writes header (see replicas.py).
+        """
+        version = db.session.execute(
+            db.update(CollectionVersion)
+            .values(version=CollectionVersion.version + 1)
+            .returning(CollectionVersion.version)
+        ).scalar()
+        db.session.info["written_version"] = version
+        return version
+
+    def to_json(self):
+        """Converts the counter into its JSON representation, the version number."""
+        return self.version
+
+    def __repr__(self):
+        """Provides a human-readable string representation of the counter."""
+        return f"<CollectionVersion {self.version}>"
+
+class SummaryCount(Base):
+    """
+    Materialized count of movies, and of watched and favourite movies, in one bucket of a dimension
+    such as releaseYear=1995 or genre=Drama. The "all" dimension holds the collection totals.
+    Kept current by the write paths (see summary.py) so dashboards read O(#buckets) rows.
+    """
+    __tablename__ = 'summary_counts'
+
+    dimension = db.Column(db.String(20), primary_key=True)
+    bucket = db.Column(db.String(80), primary_key=True)
+    movies = db.Column(db.Integer, nullable=False, default=0)
+    watched = db.Column(db.Integer, nullable=False, default=0)
+    favourite = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_json(self):
+        """Converts the bucket into a dictionary format compatible with JSON."""
+        return {
+            "dimension": self.dimension,
+            "bucket": self.bucket,
+            "movies": self.movies,
+            "watched": self.watched,
+            "favourite": self.favourite
+        }
+
+    def __repr__(self):
+        """Provides a human-readable string representation of the bucket."""
+        return f"<SummaryCount {self.dimension}={self.bucket}: {self.movies}>"
+
+def normalize_text(text):
+    """Folds case, compatibility characters and runs of whitespace, so 'The  Matrix ' matches 'the matrix'."""
+    return " ".join(unicodedata.normalize("NFKC", str(text)).casefold().split())
+
+def movie_fingerprint(title, director, release_year):
+    """
+    The duplicate-detection key of a movie: its normalized title and director and its release year, joined by
+    the ASCII unit separator so no title or name can run into the next field. None when a field is missing.
+    """
+    if not title or not director or release_year is None:
+        return None
+    return f"{normalize_text(title)}\x1f{normalize_text(director)}\x1f{release_year}"
+
 class Movie(Base):
     """
     Represents a general movie.
@@ -25,20 +153,48 @@ class Movie(Base):
     movie_id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(80), nullable=False)
     director = db.Column(db.String(80), nullable=False)
-    genre = db.Column(db.Text, nullable=False)  # Stores genres in a serialized JSON format.
     release_year = db.Column(db.Integer, nullable=False)
     duration = db.Column(db.Integer, nullable=False)
     favourite = db.Column(db.Boolean, default=False)
     is_animated = db.Column(db.Boolean, default=False)
     watched = db.Column(db.Boolean, default=False)
-    age_rating = db.Column(db.Integer, nullable=False)
+    age_rating = db.Column(db.Integer, nullable=False, index=True)
     type = db.Column(db.String(50), nullable=False)  # Discriminator column to distinguish subclasses.
+    # movie_fingerprint of the title, director and release year, indexed to find duplicates (see dedupe.py).
+    # Not unique, so collections that already hold duplicates can be migrated and cleaned up afterwards.
+    fingerprint = db.Column(db.Text, index=True)
+
+    # Genres are loaded for a whole result set in one extra query rather than one per movie.
+    genres = db.relationship('Genre', secondary=movie_genres, lazy='selectin', order_by='Genre.name')
+
+    # Indexes for the equality filters the search form combines (see benchmarks/filter_plans.py). SQLite
+    # appends movie_id to every index, so they return matches already in keyset order with no sort step;
+    # range filters (release_year, duration) are left to the ordered scan, which stops after one page.
+    __table_args__ = (
+        db.Index('ix_movies_type_favourite_watched', 'type', 'favourite', 'watched'),
+        db.Index('ix_movies_favourite_watched', 'favourite', 'watched')
+    )
 
     __mapper_args__ = {
         'polymorphic_identity': 'movie',  # Identifier for the Movie class.
         'polymorphic_on': type  # Column used to differentiate between subclasses.
     }
 
+    # Maps the keys produced by `to_json` to the columns backing them, used for field projection.
+    json_columns = {
+        "movieId": "movie_id",
+        "title": "title",
+        "director": "director",
+        "genre": "genres",
+        "releaseYear": "release_year",
+        "favourite": "favourite",
+        "duration": "duration",
+        "isAnimated": "is_animated",
+        "watched": "watched",
+        "ageRating": "age_rating",
+        "type": "type"
+    }
+
     def to_json(self):
         """Converts the movie object into a dictionary format compatible with JSON."""
         return {
@@ -56,25 +212,28 @@ class Movie(Base):
         }
         
     def set_genres(self, genres):
-        """Sets the genres for the movie as a unique JSON-serialized list."""
+        """Sets the genres for the movie as a unique list, reusing existing genre rows."""
         if not all(isinstance(genre, str) for genre in genres):
             raise ValueError("All genres must be strings")
-        unique_genres = list(set(genres))
-        self.genre = json.dumps(unique_genres)
+        unique_genres = set(genres)
+        existing = Genre.query.filter(Genre.name.in_(unique_genres)).all() if unique_genres else []
+        known = {genre.name for genre in existing}
+        self.genres = existing + [Genre(name=name) for name in unique_genres - known]
 
     def get_genres(self):
-        """Retrieves genres as a list, handling cases of missing or invalid data."""
-        if not self.genre:  # Handle None or empty string
-            return []
-        try:
-            return json.loads(self.genre)  # Deserialize JSON to list
-        except json.JSONDecodeError:
-            return []  # Handle invalid JSON
+        """Retrieves genres as a list of names."""
+        return [genre.name for genre in self.genres]
 
     def __repr__(self):
         """Provides a human-readable string representation of the movie."""
         return f"<Movie {self.title} ({self.release_year})>"
 
+@event.listens_for(Movie, "before_insert", propagate=True)
+@event.listens_for(Movie, "before_update", propagate=True)
+def set_fingerprint(mapper, connection, movie):
+    """Keeps a movie's fingerprint in step with the fields it is built from, whichever ORM path writes it."""
+    movie.fingerprint = movie_fingerprint(movie.title, movie.director, movie.release_year)
+
 class Documentary(Movie):
     """
     Represents a documentary, inheriting shared fields from the Movie class 
@@ -87,7 +246,14 @@ class Documentary(Movie):
     documentarian = db.Column(db.String(80), nullable=False)
 
     __mapper_args__ = {
-        'polymorphic_identity': 'documentary'  # Identifier for the Documentary subclass.
+        'polymorphic_identity': 'documentary',  # Identifier for the Documentary subclass.
+        'polymorphic_load': 'selectin'  # Load subclass columns for a whole result set in one query.
+    }
+
+    json_columns = {
+        "documentaryId": "documentary_id",
+        "topic": "topic",
+        "documentarian": "documentarian"
     }
 
     def to_json(self):
@@ -117,7 +283,14 @@ class KidMovies(Movie):
     parental_appeal = db.Column(db.Integer, nullable=False)  # Parental appeal score (integer).
 
     __mapper_args__ = {
-        'polymorphic_identity': 'kidMovie'  # Identifier for the Kids Movie subclass.
+        'polymorphic_identity': 'kidMovie',  # Identifier for the Kids Movie subclass.
+        'polymorphic_load': 'selectin'  # Load subclass columns for a whole result set in one query.
+    }
+
+    json_columns = {
+        "kidMovieId": "kid_movie_id",
+        "moralLesson": "moral_lesson",
+        "parentalAppeal": "parental_appeal"
     }
 
     def to_json(self):
@@ -0,0 +1,83 @@
+"""
+Content negotiation for the read endpoints: the body format picked from the Accept header (JSON, columnar JSON
+or MessagePack for searches) and the compression picked from Accept-Encoding (brotli or gzip), applied to
+bodies above COMPRESSION_MIN_SIZE bytes. Clients that send neither header get the plain JSON they always got.
+"""
+import gzip
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, g, make_response, request
+from werkzeug.datastructures import Accept, MIMEAccept
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # Only gzip is offered
+    brotli = None
+
+# Media types of the body formats. Columnar JSON holds one array per field instead of one object per movie,
+# so keys are not repeated on every row.
+JSON = "application/json"
+COLUMNAR = "application/vnd.movies.columnar+json"
+MSGPACK = "application/msgpack"
+
+# Bodies smaller than this many bytes are sent uncompressed, as compressing them saves less than it costs
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+
+# Compressors by content coding, in order of preference; brotli's default quality is too slow per response
+COMPRESSORS = {
+    **({"br": lambda body: brotli.compress(body, quality=5)} if brotli is not None else {}),
+    # A zero mtime keeps the output, and so the ETag's meaning, the same for the same body
+    "gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0)
+}
+
+# The format and content coding chosen for a request; encoding is None for an uncompressed body
+Representation = namedtuple("Representation", ["media_type", "encoding"])
+
+
+def negotiate(accept, accept_encoding, formats=(JSON,)):
+    """Picks the representation for the given Accept and Accept-Encoding header values among `formats`."""
+    media_type = parse_accept_header(accept, MIMEAccept).best_match(formats, default=formats[0])
+    encoding = parse_accept_header(accept_encoding, Accept).best_match(list(COMPRESSORS))
+    return Representation(media_type, encoding)
+
+
+def current_representation():
+    """The representation negotiated for the current request, or plain uncompressed JSON."""
+    return g.get("representation") or Representation(JSON, None)
+
+
+def content_coding(body, encoding, min_size):
+    """The content coding a body is sent with: the negotiated one, or None when it is too small to be worth it."""
+    return encoding if encoding is not None and len(body) >= min_size else None
+
+
+def compress(body, encoding, min_size):
+    """Compresses a body with the content coding, or returns None when it is too small to be worth it."""
+    encoding = content_coding(body, encoding, min_size)
+    return None if encoding is None else COMPRESSORS[encoding](body)
+
+
+def negotiated(formats=(JSON,)):
+    """
+    Negotiates a read endpoint's representation before the caching and ETag decorators key on it, and
+    compresses the successful responses the view encodes in the chosen format.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.representation = negotiate(
+                request.headers.get("Accept"), request.headers.get("Accept-Encoding"), formats
+            )
+            response = make_response(view(*args, **kwargs))
+            response.vary.update(["Accept", "Accept-Encoding"] if len(formats) > 1 else ["Accept-Encoding"])
+            if response.status_code == 200 and not response.is_streamed:
+                compressed = compress(
+                    response.get_data(), g.representation.encoding, current_app.config["COMPRESSION_MIN_SIZE"]
+                )
+                if compressed is not None:
+                    response.set_data(compressed)
+                    response.headers["Content-Encoding"] = g.representation.encoding
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,197 @@
+"""
+Opt-in request profiling. A sampled share of API requests (PROFILE_SAMPLE_RATE), and any request sending the
+PROFILE_TOKEN in its X-Profile header, runs under cProfile with every SQL statement recorded with its parameters
+and timings. Each profile is written to PROFILE_DIR as a pstats dump, which flamegraph tools such as snakeviz or
+flameprof read, and a JSON summary. Only the newest PROFILE_KEEP profiles are kept, and they are listed and
+served by the /admin/profiles endpoints to requests carrying the token. Profiles hold SQL parameters, so without
+a PROFILE_TOKEN nothing is profiled, sampled or not, and the endpoints refuse every request.
+
+One request per process is profiled at a time; others are served unprofiled meanwhile. Searches answered by the
+async read path are not profiled, as a profiler there would time every task sharing its event loop, and neither
+are /export responses, whose rows are read as the body streams, after the profile would be saved.
+"""
+import cProfile
+import hmac
+import itertools
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from flask import current_app, g, request
+import metrics
+
+# Header opting a request into profiling when it carries the configured token
+PROFILE_HEADER = "X-Profile"
+
+# Profiles kept on disk before the oldest are deleted
+DEFAULT_PROFILE_KEEP = 50
+
+# Functions listed in a profile's summary, by cumulative time
+TOP_FUNCTIONS = 25
+
+# Profile ids are "<unix milliseconds>-<process id>-<sequence>", so they sort by age across workers
+PROFILE_ID = re.compile(r"\d+-\d+-\d+")
+
+# Endpoints never profiled: the ones serving the profiles and the metrics scrapes, and the streamed export
+UNPROFILED_ENDPOINTS = {
+    "api.prometheus_metrics", "api.list_profiles", "api.get_profile", "api.get_profile_stats", "api.export_movies"
+}
+
+# cProfile allows a single active profiler per process from Python 3.12, so requests take turns
+profiler_lock = threading.Lock()
+sequence = itertools.count(1)
+
+
+def token_matches():
+    """
+    Whether the request carries the configured profiling token; never true when no token is set. Compared in
+    constant time, as bytes since compare_digest refuses non-ASCII strings, so timing does not leak the token.
+    """
+    token = current_app.config["PROFILE_TOKEN"]
+    sent = request.headers.get(PROFILE_HEADER, "")
+    return bool(token) and hmac.compare_digest(sent.encode(), token.encode())
+
+
+def admin_allowed():
+    """Whether the request may read profiles: only holders of the token, so nobody when no token is set."""
+    return token_matches()
+
+
+def wanted():
+    """Whether the current request should be profiled, by its token or by sampling, which needs a token set."""
+    if request.endpoint in UNPROFILED_ENDPOINTS or not current_app.config["PROFILE_TOKEN"]:
+        return False
+    return token_matches() or random.random() < current_app.config["PROFILE_SAMPLE_RATE"]
+
+
+def start_profile():
+    """before_request hook starting the profiler and the SQL trace for requests chosen for profiling."""
+    request_metrics = metrics.current.get()
+    if request_metrics is None or not wanted() or not profiler_lock.acquire(blocking=False):
+        return
+    request_metrics.statements = []
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def stop_profiler():
+    """Stops the request's profiler, if it has one, and returns it."""
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        profiler_lock.release()
+    return profiler
+
+
+def finish_profile(response):
+    """after_request hook saving the profile of a profiled request, and naming it in the response."""
+    profiler = stop_profiler()
+    if profiler is None:
+        return response
+    request_metrics = metrics.current.get()
+    profile_id = save_profile(profiler, {
+        "method": request.method,
+        "path": request.path,
+        "query_string": request.query_string.decode("latin-1"),
+        "status": response.status_code,
+        "duration_ms": round(request_metrics.elapsed() * 1000, 3),
+        "statements": request_metrics.statements
+    })
+    response.headers[PROFILE_HEADER + "-Id"] = profile_id
+    return response
+
+
+def abandon_profile(exception=None):
+    """teardown_request hook releasing the profiler of a request that failed before after_request ran."""
+    stop_profiler()
+
+
+def top_functions(stats):
+    """The functions with the most cumulative time, as summary rows."""
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "own_ms": round(own * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3)
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+
+def save_profile(profiler, summary):
+    """Writes the pstats dump and the JSON summary of a profile, prunes the oldest ones and returns its id."""
+    directory = current_app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{int(time.time() * 1000)}-{os.getpid()}-{next(sequence)}"
+    stats = pstats.Stats(profiler)
+    summary = {"id": profile_id, "created": time.time(), **summary, "functions": top_functions(stats)}
+
+    # Written under temporary names and renamed, so the endpoints never read a half-written profile
+    path = os.path.join(directory, profile_id)
+    stats.dump_stats(path + ".prof.tmp")
+    os.replace(path + ".prof.tmp", path + ".prof")
+    with open(path + ".json.tmp", "w") as output:
+        json.dump(summary, output)
+    os.replace(path + ".json.tmp", path + ".json")
+    prune(directory, current_app.config["PROFILE_KEEP"])
+    return profile_id
+
+
+def profile_ids(directory):
+    """The ids of the saved profiles, newest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    ids = [name[:-len(".json")] for name in names if name.endswith(".json")]
+    ids = [profile_id for profile_id in ids if PROFILE_ID.fullmatch(profile_id)]
+    return sorted(ids, key=lambda profile_id: tuple(map(int, profile_id.split("-"))), reverse=True)
+
+
+def prune(directory, keep):
+    """Deletes all but the newest `keep` profiles; other workers may be deleting the same ones."""
+    for profile_id in profile_ids(directory)[keep:]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def profile_path(profile_id, suffix):
+    """The path of a saved profile's file, or None for an id that is malformed or no longer on disk."""
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    path = os.path.join(current_app.config["PROFILE_DIR"], profile_id + suffix)
+    return path if os.path.exists(path) else None
+
+
+def load_summary(profile_id):
+    """A saved profile's JSON summary, or None if it is not on disk."""
+    path = profile_path(profile_id, ".json")
+    if path is None:
+        return None
+    try:
+        with open(path) as summary:
+            return json.load(summary)
+    except FileNotFoundError:  # Pruned since it was found
+        return None
+
+
+def list_summaries():
+    """Short summaries of the saved profiles, newest first."""
+    listed = []
+    for profile_id in profile_ids(current_app.config["PROFILE_DIR"]):
+        summary = load_summary(profile_id)
+        if summary is not None:
+            listed.append({
+                **{key: summary[key] for key in ("id", "created", "method", "path", "query_string", "status")},
+                "duration_ms": summary["duration_ms"],
+                "statements": len(summary["statements"])
+            })
+    return listed
@@ -0,0 +1,149 @@
+from configuration import db
+from models import Movie, Documentary, KidMovies
+from search import build_match, ranked_matches, build_fuzzy, fuzzy_matches, FUZZY_FILTERS
+from filters import build_search_filters
+from serialize import rows_statement, movie_json
+
+# Default and maximum number of movies returned in one page of search results
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def parse_page_args(args):
+    """Reads the `limit` and `cursor` keyset pagination parameters, raising ValueError on a bad limit."""
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("Invalid limit format")
+    if limit < 1:
+        raise ValueError("Invalid limit format")
+    return min(limit, MAX_PAGE_SIZE), args.get("cursor") or None
+
+
+def keyset_filter(cursor, ranked):
+    """
+    Builds the filter resuming a search after the cursor, raising ValueError on a malformed cursor.
+    Plain cursors are the last movie_id; ranked searches resume after the last (rank, movie_id) pair.
+    """
+    try:
+        if ranked is None:
+            return Movie.movie_id > int(cursor)
+        rank, movie_id = cursor.split(":")
+        rank, movie_id = float(rank), int(movie_id)
+    except ValueError:
+        raise ValueError("Invalid cursor format")
+    return db.or_(ranked.c.rank > rank, db.and_(ranked.c.rank == rank, Movie.movie_id > movie_id))
+
+
+def order_results(query, ranked):
+    """Orders a search query by movie_id, or by relevance when ranked, adding the rank to each row."""
+    if ranked is None:
+        return query.order_by(Movie.movie_id)
+    return (
+        query.add_columns(ranked.c.rank)
+        .join(ranked, ranked.c.movie_id == Movie.movie_id)
+        .order_by(ranked.c.rank, Movie.movie_id)
+    )
+
+
+def parse_fields(fields):
+    """Splits the `fields` parameter into JSON keys, raising ValueError on keys no movie type produces."""
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    known = {**Movie.json_columns, **Documentary.json_columns, **KidMovies.json_columns}
+    unknown = [field for field in requested if field not in known]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def parse_search(args):
+    """
+    Reads the /search_movies parameters into (filters, ranked, limit, fields), raising ValueError on bad input.
+    `ranked` is the relevance subquery of a q= or fuzzy=true search, and None when results are ordered by movie_id.
+    """
+    if (args.get("fuzzy") or "").lower() == "true":
+        # A fuzzy search is ordered by similarity, and scores only the movies the other filters keep; the text
+        # filters it does not cover still match word prefixes
+        unfuzzed = {key: value for key, value in args.items() if key not in ("q", *FUZZY_FILTERS)}
+        ranked = fuzzy_matches(build_fuzzy(args), build_search_filters(unfuzzed))
+        filters = []
+    else:
+        # A q= search is ordered by relevance, so it joins the ranked index matches
+        match = build_match(args)
+        ranked = ranked_matches(match) if match and args.get("q") else None
+        filters = build_search_filters(args, text=ranked is None)
+    limit, cursor = parse_page_args(args)
+    if cursor:
+        filters.append(keyset_filter(cursor, ranked))
+    fields = parse_fields(args["fields"]) if args.get("fields") else None
+    return filters, ranked, limit, fields
+
+
+def movies_statement(filters, ranked, limit):
+    """
+    Selects the columns of up to `limit` whole movies matching the filters, each with its rank when the search
+    is ranked, as plain rows rather than ORM instances (see serialize.py).
+    """
+    return order_results(rows_statement().where(*filters), ranked).limit(limit)
+
+
+def movie_results(rows, genres, ranked):
+    """
+    Maps the rows of movies_statement to (movie_json, rank) pairs, taking genres from {movie_id: names},
+    with rank None unless the search is ranked.
+    """
+    return [(movie_json(row, genres[row.movieId]), row.rank if ranked is not None else None) for row in rows]
+
+
+def projection_statement(fields, filters, ranked, limit):
+    """
+    Selects only the columns behind the requested fields, joining subclass tables only when one of their
+    fields is requested. Returns the statement and {field: model owning it} for projected_results.
+    """
+    movies_table = Movie.__table__
+    columns = [movies_table.c.movie_id, movies_table.c.type]
+    owners = {}
+    joined = movies_table
+
+    for model in (Movie, Documentary, KidMovies):
+        wanted = [field for field in fields if field in model.json_columns]
+        if not wanted:
+            continue
+        if model is not Movie:
+            table = model.__table__
+            joined = joined.outerjoin(table, table.primary_key.columns[0] == movies_table.c.movie_id)
+        for field in wanted:
+            owners[field] = model
+            # Genres live in their own table and are loaded separately
+            if field != "genre":
+                columns.append(model.__table__.c[model.json_columns[field]].label(field))
+
+    statement = db.select(*columns).select_from(joined).where(*filters)
+    return order_results(statement, ranked).limit(limit), owners
+
+
+def projected_results(rows, owners, genres, ranked):
+    """
+    Maps the rows of projection_statement back to the requested JSON keys, taking genres from
+    {movie_id: names}. Returns (movie_json, rank) pairs, with rank None unless the search is ranked.
+    """
+    json_movies = []
+    for row in rows:
+        movie_json = {"movieId": row.movie_id}
+        for field, model in owners.items():
+            # Fields belonging to another movie type are left out, as `to_json` would
+            if model is not Movie and row.type != model.__mapper__.polymorphic_identity:
+                continue
+            movie_json[field] = genres[row.movie_id] if field == "genre" else getattr(row, field)
+        json_movies.append((movie_json, row.rank if ranked is not None else None))
+    return json_movies
+
+
+def search_page(results, limit, ranked):
+    """Builds the /search_movies body from up to limit + 1 results, the extra one showing another page follows."""
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last_json, last_rank = results[-1]
+        next_cursor = str(last_json["movieId"]) if ranked is None else f"{last_rank!r}:{last_json['movieId']}"
+    return {"movies": [movie_json for movie_json, _ in results], "next_cursor": next_cursor}
@@ -0,0 +1,130 @@
+"""
+Read replica routing. Requests to read-only endpoints run their queries on a replica engine, taken in turn;
+writes and every other request run on the primary. Replicas are listed in DATABASE_REPLICA_URLS and registered
+as Flask-SQLAlchemy binds named replica_0, replica_1, ...
+
+Read-your-writes: a successful write answers with the collection version it committed in the
+X-Collection-Version header. A client sending the highest version it has seen back in the same header is only
+served by replicas that have caught up to it, or by the primary when none has. A replica that cannot be read is
+skipped like one that is behind.
+"""
+import itertools
+import logging
+import os
+import sqlite3
+from functools import wraps
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import make_url
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+VERSION_HEADER = "X-Collection-Version"
+
+# Bind key prefix of the replica engines
+REPLICA_BIND = "replica_"
+
+# Pragmas added on replica SQLite connections, so a write routed there by mistake fails instead of diverging
+REPLICA_PRAGMAS = {"query_only": "ON"}
+
+# Shared by every thread of the process, so successive reads spread over the replicas
+turns = itertools.count()
+
+
+class RoutingSession(Session):
+    """Session sending the queries of a read-only request to the replica chosen for it, and flushes to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get("replica") is not None:
+            return g.replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def configure(app):
+    """Reads DATABASE_REPLICA_URLS, comma-separated, into the app config and registers a bind for each replica."""
+    urls = app.config.setdefault("DATABASE_REPLICA_URLS", os.environ.get("DATABASE_REPLICA_URLS", ""))
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(",") if url.strip()]
+    app.config["DATABASE_REPLICA_URLS"] = urls
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    for index, url in enumerate(urls):
+        binds[f"{REPLICA_BIND}{index}"] = url
+
+
+def replica_engines():
+    """The engines of the app's replicas, in configuration order."""
+    engines = current_app.extensions["sqlalchemy"].engines
+    return [engine for key, engine in engines.items() if key is not None and key.startswith(REPLICA_BIND)]
+
+
+def rotation(items):
+    """The items starting from the next one in turn."""
+    if not items:
+        return []
+    start = next(turns) % len(items)
+    return items[start:] + items[:start]
+
+
+def required_version(token):
+    """The collection version a client's token requires its reads to reflect, or None without a valid token."""
+    try:
+        return int(token) if token else None
+    except ValueError:
+        return None
+
+
+def read_only(view):
+    """
+    Runs a read endpoint on the next replica that has reached the version the client requires, reading the
+    collection version for the caching and ETag decorators there, and on the primary when none has caught up or
+    answers.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Imported here because configuration imports this module for RoutingSession
+        from configuration import db
+        from models import CollectionVersion
+
+        required = required_version(request.headers.get(VERSION_HEADER))
+        for engine in rotation(replica_engines()):
+            g.replica = engine
+            try:
+                version = CollectionVersion.current()
+            except DBAPIError as error:
+                # An unreachable or broken replica is passed over, and its failed transaction discarded
+                db.session.rollback()
+                skipped(engine.url, error)
+                continue
+            if required is None or version >= required:
+                g.collection_version = version
+                return view(*args, **kwargs)
+            db.session.rollback()
+        g.replica = None
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def skipped(url, error):
+    """Logs a replica left out of a read because reading its collection version failed."""
+    logger.warning("Skipping replica %s: %s", url, error)
+
+
+def add_version_header(response):
+    """Gives a successful write's response the collection version it committed, the client's read token."""
+    from configuration import db
+    version = db.session.info.pop("written_version", None)
+    if version is not None and response.status_code < 400:
+        response.headers[VERSION_HEADER] = str(version)
+    return response
+
+
+def copy_sqlite(source_url, target_url):
+    """Copies one SQLite database over another with SQLite's online backup, a consistent snapshot of the source."""
+    source = sqlite3.connect(make_url(source_url).database)
+    target = sqlite3.connect(make_url(target_url).database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,56 @@
+"""
+Schema upgrades on startup. Importing Flask-Migrate loads Alembic, which takes longer than importing the rest of
+the app, and even a no-op upgrade reads every migration script. So the revision the database is at is compared
+with the heads of the migration scripts first, read with a query and a regex, and Alembic is only loaded when
+there is something to apply.
+"""
+import os
+import re
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from configuration import db, MIGRATIONS_DIRECTORY, init_migrations
+
+# The revision identifiers Alembic writes at the top of each migration script
+REVISION = re.compile(r"^revision(?:: str)? = ['\"](\w+)['\"]", re.MULTILINE)
+DOWN_REVISION = re.compile(r"^down_revision(?:: .*?)? = (.+)$", re.MULTILINE)
+
+
+def head_revisions(directory=MIGRATIONS_DIRECTORY):
+    """The revisions no migration script builds on, i.e. what a fully upgraded database is at."""
+    revisions, parents = set(), set()
+    versions = os.path.join(directory, "versions")
+    for name in os.listdir(versions):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(versions, name), encoding="utf-8") as script:
+            source = script.read()
+        revision, down_revision = REVISION.search(source), DOWN_REVISION.search(source)
+        if revision:
+            revisions.add(revision.group(1))
+        if down_revision:
+            # None, one quoted revision or a tuple of them, for merge points
+            parents.update(re.findall(r"['\"](\w+)['\"]", down_revision.group(1)))
+    return revisions - parents
+
+
+def applied_revisions():
+    """The revisions recorded in the database's alembic_version table; empty before the first migration."""
+    try:
+        with db.engine.connect() as connection:
+            return set(connection.execute(db.text("SELECT version_num FROM alembic_version")).scalars())
+    except DBAPIError:  # No alembic_version table yet
+        return set()
+
+
+def upgrade_database():
+    """
+    Applies pending migrations to the current app's database, returning whether there were any. Must be called
+    in an app context, like flask_migrate.upgrade.
+    """
+    heads = head_revisions()
+    if heads and applied_revisions() == heads:
+        return False
+    init_migrations(current_app._get_current_object())
+    from flask_migrate import upgrade
+    upgrade()
+    return True
@@ -0,0 +1,301 @@
+import math
+import operator
+import re
+from functools import cache, reduce
+from sqlalchemy import Float, case, cast, column, func, literal, literal_column, or_, select, table
+from configuration import db
+from models import Movie, Documentary, KidMovies
+from trigrams import SIMILARITY_THRESHOLD, trigram_sequence
+
+# FTS5 index over the movie text fields, kept in sync with movies, documentaries and
+# kidMovies by triggers (see the full-text search migration). Its rowid is the movie_id.
+movie_search = table(
+    "movie_search",
+    column("rowid"),
+    column("title"),
+    column("director"),
+    column("topic"),
+    column("documentarian"),
+    column("moral_lesson")
+)
+
+# FTS5 index of the trigrams of the fuzzy-searched columns, with punctuation as spaces and a space at each end so
+# words hold the trigrams pg_trgm pads them with, kept in sync with movies and documentaries by triggers (see
+# the trigram search migrations). Its rowid is the movie_id.
+movie_search_trigrams = table("movie_search_trigrams", column("rowid"))
+
+# Search query parameters answered by the index, mapped to the indexed column they search
+TEXT_FILTERS = {
+    "title": "title",
+    "director": "director",
+    "topic": "topic",
+    "documentarian": "documentarian",
+    "moral_lesson": "moral_lesson"
+}
+
+# bm25 weights in index column order, so a title hit outranks one in a moral lesson
+BM25_WEIGHTS = (10.0, 4.0, 3.0, 3.0, 1.0)
+
+# Search query parameters made typo-tolerant by fuzzy=true, mapped to the column they search; q searches them all
+FUZZY_FILTERS = {
+    "title": "title",
+    "director": "director",
+    "documentarian": "documentarian"
+}
+
+# Movies scored per fuzzy search, the best trigram matches first, so scoring costs the same however many movies
+# share trigrams with the terms; only the index lookup and its ranking, both in SQL, grow with them. The recall
+# trade-off: a search matching more movies than this, such as a common surname, finds only the best ranked of
+# them, so its other filters are applied before the bound to narrow the candidates first.
+FUZZY_CANDIDATES = 200
+
+# Table columns searched on databases without the FTS5 index, keyed by index column
+TEXT_COLUMNS = {
+    "title": Movie.__table__.c.title,
+    "director": Movie.__table__.c.director,
+    "topic": Documentary.__table__.c.topic,
+    "documentarian": Documentary.__table__.c.documentarian,
+    "moral_lesson": KidMovies.__table__.c.moral_lesson
+}
+
+
+def prefix_tokens(text):
+    """Splits free text into the word tokens searched as prefixes, e.g. 'star wa' becomes ['star', 'wa']."""
+    return re.findall(r"[^\W_]+", text)
+
+
+def build_match(args):
+    """
+    Collects `q` and the per-field text filters as (index column, or None for every column, tokens) pairs,
+    or returns None if there are none. A movie matches when every token prefixes a word in its column(s).
+    """
+    terms = []
+    tokens = prefix_tokens(args.get("q") or "")
+    if tokens:
+        terms.append((None, tokens))
+    for param, indexed_column in TEXT_FILTERS.items():
+        tokens = prefix_tokens(args.get(param) or "")
+        if tokens:
+            terms.append((indexed_column, tokens))
+    return tuple(terms) or None
+
+
+def fts5_expression(match):
+    """The FTS5 MATCH expression for the terms of `build_match`, e.g. '("star"* "wa"*) AND director : ("lu"*)'."""
+    parts = []
+    for indexed_column, tokens in match:
+        terms = " ".join(f'"{token}"*' for token in tokens)
+        parts.append(f"({terms})" if indexed_column is None else f"{indexed_column} : ({terms})")
+    return " AND ".join(parts)
+
+
+def uses_fts5():
+    """Whether the app's database is SQLite, which answers text searches from the FTS5 index."""
+    return db.engine.dialect.name == "sqlite"
+
+
+def word_prefix(text_column, token):
+    """Matches a word of the column starting with the token, ignoring case, as an FTS5 prefix query does."""
+    return text_column.op("~*")(f"(^|[^[:alnum:]]){token}")
+
+
+def term_conditions(match):
+    """One condition per token of the terms of `build_match`, for databases without the FTS5 index."""
+    conditions = []
+    for indexed_column, tokens in match:
+        columns = list(TEXT_COLUMNS.values()) if indexed_column is None else [TEXT_COLUMNS[indexed_column]]
+        for token in tokens:
+            conditions.append(or_(*(word_prefix(text_column, token) for text_column in columns)))
+    return conditions
+
+
+def searched_tables():
+    """movies joined to the subclass tables holding the other searched columns."""
+    movies = Movie.__table__
+    documentaries = Documentary.__table__
+    kid_movies = KidMovies.__table__
+    return movies.outerjoin(documentaries, documentaries.c.documentary_id == movies.c.movie_id).outerjoin(
+        kid_movies, kid_movies.c.kid_movie_id == movies.c.movie_id
+    )
+
+
+def matches(match):
+    """The MATCH condition against the FTS5 index for the terms of `build_match`."""
+    return literal_column("movie_search").op("MATCH")(fts5_expression(match))
+
+
+def matching_ids(match):
+    """Selects the ids of every movie matching the terms, for use in an IN filter."""
+    if uses_fts5():
+        return select(movie_search.c.rowid).where(matches(match))
+    return select(Movie.__table__.c.movie_id).select_from(searched_tables()).where(*term_conditions(match))
+
+
+def ranked_matches(match):
+    """Subquery of matching movie ids with their relevance rank; lower ranks are better matches."""
+    if uses_fts5():
+        rank = func.bm25(literal_column("movie_search"), *BM25_WEIGHTS)
+        return (
+            select(movie_search.c.rowid.label("movie_id"), rank.label("rank"))
+            .where(matches(match))
+            .subquery("ranked")
+        )
+
+    # Without bm25, every token found in a column scores that column's weight, negated to order like bm25
+    weights = dict(zip(TEXT_FILTERS.values(), BM25_WEIGHTS))
+    scores = [
+        case((word_prefix(TEXT_COLUMNS[name], token), weights[name]), else_=0.0)
+        for indexed_column, tokens in match
+        for name in (TEXT_COLUMNS if indexed_column is None else [indexed_column])
+        for token in tokens
+    ]
+    rank = cast(-reduce(operator.add, scores), Float)
+    return (
+        select(Movie.__table__.c.movie_id.label("movie_id"), rank.label("rank"))
+        .select_from(searched_tables())
+        .where(*term_conditions(match))
+        .subquery("ranked")
+    )
+
+
+@cache
+def has_trigram_extension(url):
+    """Whether the PostgreSQL database at the URL has pg_trgm, which the trigram index migration skips without."""
+    with db.engine.connect() as connection:
+        return connection.execute(db.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+def build_fuzzy(args):
+    """
+    Collects `q` and the fuzzy field filters of a fuzzy=true search as (column, or None for every fuzzy column,
+    text) pairs. Raises ValueError when there are none, a term has no word long enough to hold a trigram, or
+    the database cannot compare trigrams.
+    """
+    if not uses_fts5() and not has_trigram_extension(db.engine.url):
+        raise ValueError("Fuzzy search needs the pg_trgm extension on PostgreSQL")
+    terms = []
+    for param, fuzzy_column in [("q", None), *FUZZY_FILTERS.items()]:
+        tokens = prefix_tokens(args.get(param) or "")
+        if not tokens:
+            continue
+        if not any(len(token) >= 3 for token in tokens):
+            raise ValueError("Fuzzy search terms need a word of at least 3 letters")
+        terms.append((fuzzy_column, " ".join(tokens)))
+    if not terms:
+        raise ValueError("Fuzzy search needs q, title, director or documentarian")
+    return tuple(terms)
+
+
+def fuzzy_columns(fuzzy_column):
+    """The names of the columns a fuzzy term searches."""
+    return list(FUZZY_FILTERS.values()) if fuzzy_column is None else [fuzzy_column]
+
+
+def any_two_expression(phrases):
+    """
+    The FTS5 expression matching text holding any two of the phrases: two of the first half, two of the second,
+    or one of each. Each phrase appears about log2(n) times, rather than n times when listing every pair, which
+    keeps bm25 cheap to compute over the matches.
+    """
+    if len(phrases) == 2:
+        return f"({phrases[0]} AND {phrases[1]})"
+    first, second = phrases[:len(phrases) // 2], phrases[len(phrases) // 2:]
+    alternatives = [any_two_expression(half) for half in (first, second) if len(half) >= 2]
+    alternatives.append(f"(({' OR '.join(first)}) AND ({' OR '.join(second)}))")
+    return f"({' OR '.join(alternatives)})"
+
+
+def term_trigrams_expression(text):
+    """
+    The FTS5 expression matching text holding enough of a fuzzy term's trigrams to reach SIMILARITY_THRESHOLD:
+    a word similarity of t needs at least t of the term's distinct trigrams shared. The index has every trigram
+    pg_trgm pads words with but the '  a' starting each, so the expression asks for the rest of that share, any
+    two of the others when it is two or more and any one otherwise, and never rejects a movie the threshold
+    would keep: 'nolen' ['  n', ' no', 'nol', 'ole', 'len', 'en '] needs three shared, so two of the last five.
+    """
+    sequence = trigram_sequence(text)
+    wanted = set(sequence)
+    indexed = [f'"{trigram}"' for trigram in dict.fromkeys(sequence) if not trigram.startswith("  ")]
+    needed = math.ceil(SIMILARITY_THRESHOLD * len(wanted)) - (len(wanted) - len(indexed))
+    if needed < 2 or len(indexed) < 2:
+        return f"({' OR '.join(indexed)})"
+    return any_two_expression(indexed)
+
+
+def trigram_expression(terms):
+    """
+    The FTS5 MATCH expression finding movies sharing enough trigrams with each fuzzy term to match it, e.g.
+    '{title director documentarian} : ((" sh" AND "sha") OR (("adw" AND "dw ") OR ...) OR ((" sh" OR "sha") AND ...))'.
+    """
+    parts = []
+    for fuzzy_column, text in terms:
+        parts.append(f"{{{' '.join(fuzzy_columns(fuzzy_column))}}} : {term_trigrams_expression(text)}")
+    return " AND ".join(parts)
+
+
+def fuzzy_scores(terms):
+    """
+    Each fuzzy term's score: its word similarity to the best matching of its columns. SQLite has the function
+    from trigrams.py, and spells greatest() as a max() of several arguments.
+    """
+    greatest = func.max if uses_fts5() else func.greatest
+    scores = []
+    for fuzzy_column, text in terms:
+        similarities = [func.word_similarity(text, TEXT_COLUMNS[name]) for name in fuzzy_columns(fuzzy_column)]
+        scores.append(similarities[0] if len(similarities) == 1 else greatest(*similarities))
+    return scores
+
+
+def fuzzy_candidates(terms, filters):
+    """
+    Subquery of the ids of at most FUZZY_CANDIDATES movies kept by the other search filters that share enough
+    trigrams with every fuzzy term to possibly match it. On SQLite they are found through the trigram index and
+    taken by bm25 rank, the movies holding the most and rarest of the terms' trigrams first; on PostgreSQL they
+    are found by pg_trgm's indexed <% operator and taken by word similarity.
+    """
+    movies = Movie.__table__
+    if uses_fts5():
+        trigram_index = literal_column("movie_search_trigrams")
+        return (
+            select(movies.c.movie_id)
+            .select_from(searched_tables().join(movie_search_trigrams, movie_search_trigrams.c.rowid == movies.c.movie_id))
+            .where(trigram_index.op("MATCH")(trigram_expression(terms)), *filters)
+            .order_by(func.bm25(trigram_index), movies.c.movie_id)
+            .limit(FUZZY_CANDIDATES)
+            .subquery("candidates")
+        )
+
+    conditions = [
+        or_(*(literal(text).op("<%")(TEXT_COLUMNS[name]) for name in fuzzy_columns(fuzzy_column)))
+        for fuzzy_column, text in terms
+    ]
+    return (
+        select(movies.c.movie_id)
+        .select_from(searched_tables())
+        .where(*conditions, *filters)
+        .order_by(reduce(operator.add, fuzzy_scores(terms)).desc(), movies.c.movie_id)
+        .limit(FUZZY_CANDIDATES)
+        .subquery("candidates")
+    )
+
+
+def fuzzy_matches(terms, filters):
+    """
+    Subquery of the candidate movies with a word similarity of at least SIMILARITY_THRESHOLD to every fuzzy term,
+    with their rank: the negated mean of the terms' scores, so lower ranks are better matches as with
+    ranked_matches. The other search filters pick the candidates, so only the movies they keep are scored.
+    """
+    movies = Movie.__table__
+    candidates = fuzzy_candidates(terms, filters)
+    scored = (
+        select(movies.c.movie_id, *(score.label(f"score_{index}") for index, score in enumerate(fuzzy_scores(terms))))
+        .select_from(searched_tables().join(candidates, candidates.c.movie_id == movies.c.movie_id))
+        .subquery("scored")
+    )
+    scores = [scored.c[f"score_{index}"] for index in range(len(terms))]
+    rank = cast(-reduce(operator.add, scores) / len(scores), Float)
+    return (
+        select(scored.c.movie_id, rank.label("rank"))
+        .where(*(score >= SIMILARITY_THRESHOLD for score in scores))
+        .subquery("ranked")
+    )
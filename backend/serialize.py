@@ -0,0 +1,129 @@
+"""
+Row serialization: builds the JSON of whole movies straight from selected column tuples, without loading ORM
+instances, and encodes search pages with orjson when it is installed. The dicts equal what the models' to_json
+returns, key order included, and the encoded bytes equal what the app's JSON provider writes. Pages can also be
+encoded column by column or as MessagePack, for the formats negotiated in negotiation.py.
+"""
+import re
+from operator import itemgetter
+from flask import current_app
+from configuration import db
+from models import Movie, Documentary, KidMovies
+
+from negotiation import JSON, COLUMNAR, MSGPACK
+import metrics
+
+try:
+    import orjson
+except ImportError:  # The stdlib encoder is used instead
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack is not offered
+    msgpack = None
+
+# Subclass tables joined to movies for whole-movie rows, keyed by movie type
+SUBCLASSES = {model.__mapper__.polymorphic_identity: model for model in (Documentary, KidMovies)}
+
+# Bytes the stdlib encoder writes as \u escapes with ensure_ascii, and orjson writes raw
+UNESCAPED = re.compile(rb"[\x7f-\xff]")
+
+
+def column_labels():
+    """The JSON keys of every column selected for a whole-movie row, in select order."""
+    return [key for model in (Movie, *SUBCLASSES.values()) for key in model.json_columns if key != "genre"]
+
+
+def compile_layouts():
+    """
+    Precomputes, per movie type, the keys of its to_json output in order and a getter picking their values out
+    of a row of rows_statement with the movie's genre names appended as its last item.
+    """
+    positions = {key: index for index, key in enumerate(column_labels())}
+    positions["genre"] = -1
+    keys_by_type = {Movie.__mapper__.polymorphic_identity: list(Movie.json_columns)}
+    for movie_type, model in SUBCLASSES.items():
+        keys_by_type[movie_type] = [*Movie.json_columns, *model.json_columns]
+    return {
+        movie_type: (keys, itemgetter(*(positions[key] for key in keys)))
+        for movie_type, keys in keys_by_type.items()
+    }
+
+
+LAYOUTS = compile_layouts()
+
+
+def rows_statement():
+    """Selects the columns of whole movies, subclass columns included, labelled with their JSON keys."""
+    movies = Movie.__table__
+    columns = [movies.c[column].label(key) for key, column in Movie.json_columns.items() if key != "genre"]
+    joined = movies
+    for model in SUBCLASSES.values():
+        table = model.__table__
+        joined = joined.outerjoin(table, table.primary_key.columns[0] == movies.c.movie_id)
+        columns += [table.c[column].label(key) for key, column in model.json_columns.items()]
+    return db.select(*columns).select_from(joined)
+
+
+def movie_json(row, genres):
+    """The to_json dict of one row of rows_statement, given its sorted genre names."""
+    keys, values = LAYOUTS[row.type]
+    return dict(zip(keys, values((*row, genres))))
+
+
+def dumps(obj, app=None):
+    """
+    Encodes a response body exactly like the app's JSON provider does, through orjson when it is installed.
+    Only for bodies without floats, which the two encoders format differently.
+    """
+    app = app or current_app
+    provider = app.json
+    compact = provider.compact if provider.compact is not None else not app.debug
+    if orjson is not None and compact and provider.sort_keys and provider.ensure_ascii:
+        body = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+        if not UNESCAPED.search(body):
+            return body
+    return provider.response(obj).get_data()
+
+
+def json_response(obj, status=200):
+    """A JSON response whose body is encoded by `dumps`."""
+    return current_app.response_class(dumps(obj), status=status, mimetype=current_app.json.mimetype)
+
+
+def columnar(page):
+    """
+    Turns a search page's list of movies into one list per JSON key, in order of first appearance, holding None
+    for movies without the key, e.g. the topic of a kids' movie.
+    """
+    keys = list(dict.fromkeys(key for movie in page["movies"] for key in movie))
+    return {
+        "columns": {key: [movie.get(key) for movie in page["movies"]] for key in keys},
+        "count": len(page["movies"]),
+        "next_cursor": page["next_cursor"]
+    }
+
+
+# Search page encoders by media type, each taking the page and the app whose JSON settings apply
+PAGE_ENCODERS = {
+    JSON: dumps,
+    COLUMNAR: lambda page, app=None: dumps(columnar(page), app),
+    **({MSGPACK: lambda page, app=None: msgpack.packb(page)} if msgpack is not None else {})
+}
+
+
+def search_formats():
+    """The media types a search can be answered in, plain JSON first."""
+    return tuple(PAGE_ENCODERS)
+
+
+def encode_page(page, media_type, app=None):
+    """Encodes a search page in the negotiated media type, timing it for the request's metrics."""
+    with metrics.serializing(len(page["movies"])):
+        return PAGE_ENCODERS[media_type](page, app)
+
+
+def page_response(page, media_type):
+    """A search page response in the negotiated media type."""
+    return current_app.response_class(encode_page(page, media_type), mimetype=media_type)
@@ -0,0 +1,77 @@
+"""
+Production server: runs the app under gunicorn with one worker process per available core, each running a
+small thread pool. Workers build their own app with create_app after the fork, so every process opens its own
+database connections. Started with `flask --app main serve`; with `--asgi` the workers run the async read path
+of async_api.py on uvicorn event loops instead.
+
+Send SIGHUP to the master process to reload the code and replace the workers gracefully, and SIGTERM to stop.
+"""
+import os
+from gunicorn.app.base import BaseApplication
+
+# Address served by default; put a reverse proxy in front to expose it beyond the host
+DEFAULT_BIND = "127.0.0.1:5000"
+
+# Threads per worker, overlapping requests that wait on the database or on slow clients
+DEFAULT_THREADS = 4
+
+# Seconds an idle keep-alive connection stays open for the client's next request
+KEEPALIVE = 5
+
+# Seconds a worker may spend on a request before it is restarted, and to finish its requests on reload or stop
+TIMEOUT = 60
+GRACEFUL_TIMEOUT = 30
+
+# Requests after which a worker is replaced, jittered so the workers do not all restart at once
+MAX_REQUESTS = 10000
+MAX_REQUESTS_JITTER = 1000
+
+
+def available_cores():
+    """The number of cores this process may run on, honouring CPU affinity set by containers or taskset."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def server_options(bind=DEFAULT_BIND, workers=None, threads=DEFAULT_THREADS, asgi=False):
+    """The gunicorn settings for the given address and pool size, with one worker per available core by default."""
+    return {
+        "bind": bind,
+        "workers": workers or available_cores(),
+        "threads": threads,
+        # Event-loop workers keep their own thread pool for the Flask routes, see async_api.WSGI_THREADS
+        "worker_class": "uvicorn_worker.UvicornWorker" if asgi else "gthread",
+        "keepalive": KEEPALIVE,
+        "timeout": TIMEOUT,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS_JITTER,
+        # Each worker imports and builds the app itself, which is also what lets SIGHUP pick up new code
+        "preload_app": False,
+        "accesslog": "-"
+    }
+
+
+class Server(BaseApplication):
+    """
+    Embeds gunicorn so it serves create_app(), or create_asgi_app() when `asgi` is set, with the options given
+    instead of reading its own command line.
+    """
+
+    def __init__(self, options, asgi=False):
+        self.options = options
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        if self.asgi:
+            from async_api import create_asgi_app
+            return create_asgi_app()
+        from configuration import create_app
+        return create_app()
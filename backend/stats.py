@@ -0,0 +1,89 @@
+from configuration import db
+from models import Movie, Genre, SummaryCount, movie_genres
+
+# Default width, in minutes, of the duration histogram buckets
+DEFAULT_DURATION_BUCKET = 30
+
+
+def grouped_counts(column, filters, key, joins=()):
+    """Counts the filtered movies per value of `column`, as [{key: value, "count": n}] ordered by value."""
+    query = db.select(column, db.func.count()).select_from(Movie.__table__)
+    for table, condition in joins:
+        query = query.join(table, condition)
+    rows = db.session.execute(query.where(*filters).group_by(column).order_by(column)).all()
+    return [{key: value, "count": count} for value, count in rows]
+
+
+def totals(filters):
+    """Counts the filtered movies and how many are watched and favourites, with their ratios."""
+    total, watched, favourite = db.session.execute(
+        db.select(
+            db.func.count(),
+            db.func.sum(db.case((Movie.watched, 1), else_=0)),
+            db.func.sum(db.case((Movie.favourite, 1), else_=0))
+        ).select_from(Movie.__table__).where(*filters)
+    ).one()
+    ratio = lambda count: (count or 0) / total if total else 0.0
+    return {
+        "total": total,
+        "watched": {"count": watched or 0, "ratio": ratio(watched)},
+        "favourite": {"count": favourite or 0, "ratio": ratio(favourite)}
+    }
+
+
+# Aggregations /stats can compute, keyed by the name used in its `include` parameter
+AGGREGATIONS = {
+    "releaseYear": lambda filters, bucket: grouped_counts(Movie.release_year, filters, "releaseYear"),
+    "type": lambda filters, bucket: grouped_counts(Movie.type, filters, "type"),
+    "ageRating": lambda filters, bucket: grouped_counts(Movie.age_rating, filters, "ageRating"),
+    "genre": lambda filters, bucket: grouped_counts(Genre.name, filters, "genre", joins=(
+        (movie_genres, movie_genres.c.movie_id == Movie.movie_id),
+        (Genre.__table__, Genre.genre_id == movie_genres.c.genre_id)
+    )),
+    "duration": lambda filters, bucket: grouped_counts(
+        (Movie.duration // bucket * bucket).label("bucket"), filters, "durationFrom"
+    )
+}
+
+
+# Aggregations kept in the summary_counts table, mapped to how their bucket text converts back to a value
+SUMMARIZED = {"releaseYear": int, "type": str, "ageRating": int, "genre": str}
+
+
+def summary_stats(names):
+    """Reads the totals and the named summarized aggregations of the whole collection from summary_counts."""
+    rows = db.session.execute(
+        db.select(SummaryCount).where(SummaryCount.dimension.in_(["all", *names]))
+    ).scalars().all()
+    total = next((row for row in rows if row.dimension == "all"), None)
+    count, watched, favourite = (total.movies, total.watched, total.favourite) if total else (0, 0, 0)
+    ratio = lambda value: value / count if count else 0.0
+    result = {
+        "total": count,
+        "watched": {"count": watched, "ratio": ratio(watched)},
+        "favourite": {"count": favourite, "ratio": ratio(favourite)}
+    }
+    for name in names:
+        convert = SUMMARIZED[name]
+        buckets = sorted(
+            (convert(row.bucket), row.movies) for row in rows if row.dimension == name and row.movies > 0
+        )
+        result[f"by{name[0].upper()}{name[1:]}"] = [{name: value, "count": count} for value, count in buckets]
+    return result
+
+
+def collection_stats(filters, include=None, duration_bucket=DEFAULT_DURATION_BUCKET):
+    """
+    Computes the totals plus the requested aggregations (all by default) over the filtered movies.
+    Unfiltered requests read the summarized aggregations from summary_counts; the rest are grouped in SQL.
+    """
+    names = include or list(AGGREGATIONS)
+    if filters:
+        result = totals(filters)
+    else:
+        result = summary_stats([name for name in names if name in SUMMARIZED])
+    for name in names:
+        key = f"by{name[0].upper()}{name[1:]}"
+        if key not in result:
+            result[key] = AGGREGATIONS[name](filters, duration_bucket)
+    return result
@@ -0,0 +1,91 @@
+"""
+Storage profiles: the SQLite pragmas set on every new connection and the connection pool settings, chosen with
+the STORAGE_PROFILE setting and overridable one pragma at a time with SQLITE_PRAGMAS.
+"""
+import os
+from sqlalchemy import event, make_url
+import trigrams
+
+# Pragmas per profile, applied in order on every new SQLite connection
+SQLITE_PROFILES = {
+    # Readers never block the writer, and commits fsync only at checkpoints rather than on every transaction
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,  # Milliseconds a connection waits on a locked database before failing
+        "cache_size": -65536,  # Page cache per connection, in KiB when negative (64 MiB)
+        "mmap_size": 268435456,  # Bytes of the file read through memory mapping (256 MiB)
+        "temp_store": "MEMORY"  # Sorts and temporary indexes stay out of temporary files
+    },
+    # SQLite's stock settings; the journal mode is persistent, so it is set back explicitly
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL"
+    }
+}
+
+DEFAULT_PROFILE = "tuned"
+
+# Connections kept open per process, and the extra ones opened under bursts, for threaded server workers
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MAX_OVERFLOW = 8
+
+# Seconds a request waits for a pooled connection before failing
+DEFAULT_POOL_TIMEOUT = 30
+
+
+def sqlite_pragmas(profile, overrides=""):
+    """
+    The pragmas of a profile, with `overrides` given as "name=value,..." replacing or adding pragmas.
+    Raises ValueError on an unknown profile or a malformed override.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown storage profile {profile}; expected one of {', '.join(SQLITE_PROFILES)}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for item in filter(None, (item.strip() for item in overrides.split(","))):
+        name, separator, value = item.partition("=")
+        if not separator or not name.strip().isidentifier() or not value.strip().replace("-", "").isalnum():
+            raise ValueError(f"Invalid SQLite pragma override {item}")
+        pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+def configure(app):
+    """Reads the storage settings from the environment into the app config, keeping values already set."""
+    app.config.setdefault("STORAGE_PROFILE", os.environ.get("STORAGE_PROFILE", DEFAULT_PROFILE))
+    app.config.setdefault("SQLITE_PRAGMAS", os.environ.get("SQLITE_PRAGMAS", ""))
+
+    # An in-memory SQLite database lives in its connection, so it keeps SQLAlchemy's single-connection pool
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", DEFAULT_MAX_OVERFLOW)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT))
+    })
+
+
+def tune_engine(engine, pragmas):
+    """
+    Sets the pragmas, and registers the SQL function fuzzy searches use (see trigrams.py), on every connection
+    the engine opens, when it is a SQLite engine. On PostgreSQL, sets the threshold of pg_trgm's <% operator.
+    """
+    if engine.dialect.name == "postgresql":
+        @event.listens_for(engine, "connect")
+        def set_similarity_threshold(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"SET pg_trgm.word_similarity_threshold = {trigrams.SIMILARITY_THRESHOLD}")
+            cursor.close()
+            # Committed, as the pool rolls back what a new connection's first transaction set otherwise
+            dbapi_connection.commit()
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def prepare_connection(dbapi_connection, connection_record):
+        dbapi_connection.create_function("word_similarity", 2, trigrams.word_similarity, deterministic=True)
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
@@ -0,0 +1,142 @@
+import importlib
+from collections import defaultdict
+from sqlalchemy import event, inspect, insert, delete
+from sqlalchemy.orm import Session
+from configuration import db
+from models import Movie, Genre, SummaryCount, movie_genres
+
+# Dimensions summarized per movie column; genres and the "all" totals are handled separately
+DIMENSIONS = {"releaseYear": "release_year", "type": "type", "ageRating": "age_rating"}
+
+# Movie attributes whose changes move a movie between buckets or change its counts
+TRACKED_ATTRIBUTES = ("release_year", "age_rating", "watched", "favourite", "genres")
+
+
+def empty_deltas():
+    """An accumulator of [movies, watched, favourite] changes keyed by (dimension, bucket)."""
+    return defaultdict(lambda: [0, 0, 0])
+
+
+def add_movie_counts(deltas, values, genres, sign):
+    """Adds (sign=1) or removes (sign=-1) one movie's contribution to each bucket it falls in."""
+    counts = (sign, sign if values["watched"] else 0, sign if values["favourite"] else 0)
+    buckets = [("all", "")] + [(dimension, str(values[column])) for dimension, column in DIMENSIONS.items()]
+    buckets += [("genre", name) for name in set(genres)]
+    for bucket in buckets:
+        for index, count in enumerate(counts):
+            deltas[bucket][index] += count
+
+
+def apply_deltas(connection, deltas):
+    """
+    Adds the accumulated changes to the summary table with one executemany upsert.
+    Both SQLite and PostgreSQL spell it INSERT ... ON CONFLICT DO UPDATE. Emptied buckets are kept at zero,
+    which readers skip, until the next rebuild.
+    """
+    rows = [
+        {"dimension": dimension, "bucket": bucket, "movies": movies, "watched": watched, "favourite": favourite}
+        for (dimension, bucket), (movies, watched, favourite) in deltas.items()
+        if movies or watched or favourite
+    ]
+    if not rows:
+        return
+    table = SummaryCount.__table__
+    # The connection's engine has loaded its dialect's module already; importing both up front slows startup
+    dialect_insert = importlib.import_module(f"sqlalchemy.dialects.{connection.dialect.name}").insert
+    statement = dialect_insert(table)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.dimension, table.c.bucket],
+        set_={name: table.c[name] + statement.excluded[name] for name in ("movies", "watched", "favourite")}
+    ), rows)
+
+
+def aggregate_counts(where=(), sign=1):
+    """Computes the summary buckets of the movies matching `where` with GROUP BY queries, scaled by sign."""
+    movies = Movie.__table__
+    deltas = empty_deltas()
+    watched = db.func.sum(db.case((movies.c.watched, 1), else_=0))
+    favourite = db.func.sum(db.case((movies.c.favourite, 1), else_=0))
+
+    columns = [movies.c[column] for column in DIMENSIONS.values()]
+    rows = db.session.execute(
+        db.select(*columns, db.func.count(), watched, favourite).where(*where).group_by(*columns)
+    )
+    for row in rows:
+        counts = [sign * (value or 0) for value in row[-3:]]
+        buckets = [("all", "")] + [(dimension, str(value)) for dimension, value in zip(DIMENSIONS, row[:-3])]
+        for bucket in buckets:
+            for index, count in enumerate(counts):
+                deltas[bucket][index] += count
+
+    rows = db.session.execute(
+        db.select(Genre.name, db.func.count(), watched, favourite)
+        .select_from(movies)
+        .join(movie_genres, movie_genres.c.movie_id == movies.c.movie_id)
+        .join(Genre.__table__, Genre.genre_id == movie_genres.c.genre_id)
+        .where(*where)
+        .group_by(Genre.name)
+    )
+    for name, *counts in rows:
+        deltas[("genre", name)] = [sign * (value or 0) for value in counts]
+    return deltas
+
+
+def deltas_for_ids(ids, sign):
+    """The summary contribution of the given movies, for write paths that change them with set-based SQL."""
+    return aggregate_counts([Movie.movie_id.in_(ids)], sign)
+
+
+def rebuild():
+    """Recomputes every bucket from the movies tables, returning how many buckets had drifted."""
+    table = SummaryCount.__table__
+    fresh = dict(aggregate_counts())
+    fresh.setdefault(("all", ""), [0, 0, 0])
+    stored = {
+        (row.dimension, row.bucket): [row.movies, row.watched, row.favourite]
+        for row in db.session.execute(db.select(table))
+        if row.movies or row.watched or row.favourite or row.dimension == "all"
+    }
+    drifted = sum(1 for key in fresh.keys() | stored.keys() if fresh.get(key) != stored.get(key))
+
+    db.session.execute(delete(table))
+    db.session.execute(insert(table), [
+        {"dimension": dimension, "bucket": bucket, "movies": movies, "watched": watched, "favourite": favourite}
+        for (dimension, bucket), (movies, watched, favourite) in fresh.items()
+    ])
+    db.session.commit()
+    return drifted
+
+
+def attribute_values(movie, committed):
+    """A movie's tracked values and genre names, as last loaded from the database or as currently set."""
+    state = inspect(movie)
+    values = {}
+    for name in TRACKED_ATTRIBUTES:
+        history = state.attrs[name].history
+        if committed:
+            current = list(history.unchanged) + list(history.deleted)
+        else:
+            current = list(history.unchanged) + list(history.added)
+        values[name] = current if name == "genres" else (current[0] if current else None)
+    values["type"] = movie.__mapper__.polymorphic_identity
+    return values, [genre.name for genre in values.pop("genres")]
+
+
+@event.listens_for(Session, "before_flush")
+def track_movie_changes(session, flush_context, instances):
+    """Moves the summary counts of movies the ORM is about to insert, update or delete, in the same transaction."""
+    deltas = empty_deltas()
+    for movie in session.new:
+        if isinstance(movie, Movie):
+            add_movie_counts(deltas, *attribute_values(movie, committed=False), 1)
+    for movie in session.deleted:
+        if isinstance(movie, Movie):
+            add_movie_counts(deltas, *attribute_values(movie, committed=True), -1)
+    for movie in session.dirty:
+        if isinstance(movie, Movie) and movie not in session.deleted and session.is_modified(movie):
+            state = inspect(movie)
+            if any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES):
+                add_movie_counts(deltas, *attribute_values(movie, committed=True), -1)
+                add_movie_counts(deltas, *attribute_values(movie, committed=False), 1)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
@@ -0,0 +1,61 @@
+"""
+Trigram similarity for fuzzy searches on SQLite, registered as the word_similarity SQL function on every SQLite
+connection (see storage.tune_engine), so fuzzy searches rank with the same SQL that pg_trgm answers on PostgreSQL.
+"""
+import re
+from functools import lru_cache
+
+# Least word similarity of a fuzzy match. pg_trgm's default of 0.6 misses one wrong letter in words of under ten
+# letters; at 0.5, words of eight letters or more tolerate one. PostgreSQL connections set it as
+# pg_trgm.word_similarity_threshold, which its indexed <% operator applies.
+SIMILARITY_THRESHOLD = 0.5
+
+# (query, text) pairs whose similarity is remembered. A fuzzy search scores every movie sharing trigrams with the
+# query, and titles and directors repeat across movies, so most of those scores were computed already.
+SIMILARITY_CACHE_SIZE = 65536
+
+
+def trigram_sequence(text):
+    """
+    The trigrams of each word of the text in order, lowercased, with each word padded by two spaces in front and
+    one behind as pg_trgm does, so 'Up' gives ['  u', ' up', 'up '].
+    """
+    trigrams = []
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        trigrams.extend(padded[start:start + 3] for start in range(len(padded) - 2))
+    return trigrams
+
+
+@lru_cache(maxsize=SIMILARITY_CACHE_SIZE)
+def word_similarity(query, text):
+    """
+    After pg_trgm's word_similarity: the greatest similarity between the query's trigrams and those of any run of
+    consecutive trigrams of the text, each similarity being shared trigrams over distinct trigrams. 1 when the
+    query appears in the text, and close to it when a misspelt query nearly does. 0 for a missing text, where
+    PostgreSQL returns NULL, so SQLite's max() of several still picks the best column.
+    """
+    if query is None or text is None:
+        return 0.0
+    wanted = set(trigram_sequence(query))
+    if not wanted:
+        return 0.0
+    sequence = trigram_sequence(text)
+    best = 0.0
+    for start, first in enumerate(sequence):
+        # A run starting with an unwanted trigram scores less than the same run without it
+        if first not in wanted:
+            continue
+        seen, shared = set(), 0
+        for trigram in sequence[start:]:
+            if trigram in seen:
+                continue
+            seen.add(trigram)
+            # Only a shared trigram can raise the run's similarity, and only an unmatched one lower it
+            if trigram in wanted:
+                shared += 1
+                best = max(best, shared / (len(wanted) + len(seen) - shared))
+            # Even matching every remaining wanted trigram could not beat the best run any more
+            elif len(wanted) / (len(wanted) + len(seen) - shared) <= best:
+                break
+    return best
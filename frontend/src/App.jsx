@@ -1,13 +1,16 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import EditingMovieRecord from "./components/EditingMovieRecord"; // Component to add/search movies
 import MovieList from "./components/MovieList"; // Component to display the list of movies
 import MovieYearChart from "./components/MovieYearChart"; // Component to display the movie chart
+import { apiFetch } from "./api"; // fetch() that keeps reads consistent with this tab's writes
 
 import "./App.css"; // App's CSS
 
 function App() {
-  const [allMovies, setAllMovies] = useState([]);
+  const [yearCounts, setYearCounts] = useState([]); // Movie counts per release year for the chart
   const [movies, setMovies] = useState([]); // Movies state to store the list of movies
+  const [nextCursor, setNextCursor] = useState(null); // Cursor of the next page of search results, if any
+  const searchQuery = useRef(""); // Query string of the search whose results are loaded
   const [currentMovie, setCurrentMovie] = useState({}); // State for the currently selected movie for update
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [params, setParams] = useState(""); // Query parameters for movie search
@@ -26,22 +29,46 @@ function App() {
     setIsModalOpen(true);
   };
 
-  const fetchAllMovies = async () => {
-    const response = await fetch('http://127.0.0.1:5000/search_movies');
+  // Fetch one page of search results, starting after the cursor when given
+  const fetchPage = async (queryString, cursor = null) => {
+    const pageParams = new URLSearchParams(queryString);
+    if (cursor) pageParams.set("cursor", cursor);
+    const response = await apiFetch(`http://127.0.0.1:5000/search_movies?${pageParams.toString()}`);
+    if (!response.ok) {
+      throw new Error(`HTTP error! Status: ${response.status}`);
+    }
+    return response.json();
+  };
+
+  // Fetch the per-year movie counts, aggregated by the backend
+  const fetchYearCounts = async () => {
+    const response = await apiFetch("http://127.0.0.1:5000/stats?include=releaseYear");
     const data = await response.json();
-    setAllMovies(data.movies || []);  // Make sure 'allMovies' is the correct property
+    setYearCounts(data.byReleaseYear || []);
   };
 
-  // Fetch movies from the backend
+  // Fetch the first page of movies from the backend
   const fetchMovies = async (params = "") => {
     try {
       const queryString = params instanceof URLSearchParams ? params.toString() : params;
-      const response = await fetch(`http://127.0.0.1:5000/search_movies?${queryString}`);
-      if (!response.ok) {
-        throw new Error(`HTTP error! Status: ${response.status}`);
-      }
-      const data = await response.json();
+      searchQuery.current = queryString;
+      const data = await fetchPage(queryString);
       setMovies(data.movies || []); // Update the movie list
+      setNextCursor(data.next_cursor || null);
+    } catch (error) {
+      console.error("Error fetching movies:", error);
+    }
+  };
+
+  // Fetch the next page of movies once the list pages past those already loaded
+  const loadMoreMovies = async () => {
+    if (!nextCursor) return;
+    try {
+      const queryString = searchQuery.current;
+      const data = await fetchPage(queryString, nextCursor);
+      if (searchQuery.current !== queryString) return; // A new search replaced these results meanwhile
+      setMovies((loaded) => [...loaded, ...(data.movies || [])]);
+      setNextCursor(data.next_cursor || null);
     } catch (error) {
       console.error("Error fetching movies:", error);
     }
@@ -53,10 +80,10 @@ function App() {
     fetchMovies(params);
   };
 
-  // Fetch movies and all movies when the component mounts
+  // Fetch movies and the chart data when the component mounts
   useEffect(() => {
     fetchMovies();
-    fetchAllMovies();
+    fetchYearCounts();
   }, []);
 
   // Fetch movies when the search params change
@@ -104,7 +131,7 @@ function App() {
             className={`btn-primary ${activeTab === "Graph" ? "bg-green-700" : "bg-blue-900"}`}
             onClick={() => {
               setActiveTab("Graph");
-              fetchAllMovies();
+              fetchYearCounts();
             }}
           >
             By Year Chart
@@ -114,11 +141,17 @@ function App() {
         {/* Conditional Rendering Based on Active Tab */}
         <div className="bg-blue-900 text-white p-6 rounded-md shadow-md w-full">
           {activeTab === "Movies" ? (
-            <MovieList movies={movies} updateMovie={openEditModal} updateCallBack={onUpdate} />
+            <MovieList
+              movies={movies}
+              hasMore={nextCursor !== null}
+              loadMore={loadMoreMovies}
+              updateMovie={openEditModal}
+              updateCallBack={onUpdate}
+            />
           ) : (
             // Display the graph tab content
             <div className="bg-black text-white p-6 rounded-md shadow-md w-full mb-8">
-              <MovieYearChart allMovies={allMovies} />
+              <MovieYearChart yearCounts={yearCounts} />
             </div>
           )}
         </div>
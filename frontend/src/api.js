@@ -0,0 +1,18 @@
+// Header carrying the collection version a write committed; sending it back makes the backend serve this
+// client's reads from a read replica only once the replica has caught up with its own writes
+const VERSION_HEADER = "X-Collection-Version";
+const STORAGE_KEY = "collectionVersion";
+
+// fetch() wrapper that remembers the highest collection version seen for this tab and sends it on every request
+export const apiFetch = async (url, options = {}) => {
+  const headers = new Headers(options.headers);
+  const known = sessionStorage.getItem(STORAGE_KEY);
+  if (known) headers.set(VERSION_HEADER, known);
+
+  const response = await fetch(url, { ...options, headers });
+  const written = response.headers.get(VERSION_HEADER);
+  if (written && Number(written) > Number(known || 0)) {
+    sessionStorage.setItem(STORAGE_KEY, written);
+  }
+  return response;
+};
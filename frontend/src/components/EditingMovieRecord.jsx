@@ -1,5 +1,6 @@
 import React, { useState } from "react";
 import MovieList from "./MovieList";
+import { apiFetch } from "../api";
 
 const EditingMovieRecord = ({ action, existingMovie = {}, updateCallBack, params, setParams }) => {
     // State variables to hold form data for movie fields
@@ -57,7 +58,7 @@ const EditingMovieRecord = ({ action, existingMovie = {}, updateCallBack, params
             console.log("Request URL:", url);
             console.log("Request Options:", options);
 
-            const response = await fetch(url, options);
+            const response = await apiFetch(url, options);
 
             // Handle the response based on status
             if (response.status !== 201 && response.status !== 200) {
@@ -1,6 +1,7 @@
 import React, { useState } from "react";
+import { apiFetch } from "../api";
 
-const MovieList = ({ movies, updateMovie, updateCallback }) => {
+const MovieList = ({ movies, hasMore, loadMore, updateMovie, updateCallback }) => {
     const [currentPage, setCurrentPage] = useState(1); // State to track the current page for pagination
     const moviesPerPage = 6; // The number of movies displayed per page
 
@@ -19,11 +20,21 @@ const MovieList = ({ movies, updateMovie, updateCallback }) => {
         setCurrentPage(Math.max(1, Math.min(newPage, totalPages)));
     };
 
+    // Go to the next page, loading more movies from the backend once the loaded ones run out
+    const goToNextPage = async () => {
+        if (currentPage < totalPages) {
+            setPageSafely(currentPage + 1);
+        } else if (hasMore) {
+            await loadMore();
+            setCurrentPage(currentPage + 1);
+        }
+    };
+
     // Function to handle deletion of a movie
     const onDelete = async (id) => {
         try {
             const options = { method: "DELETE" };
-            const response = await fetch(`http://127.0.0.1:5000/delete_movie/${id}`, options); // API call to delete movie
+            const response = await apiFetch(`http://127.0.0.1:5000/delete_movie/${id}`, options); // API call to delete movie
             if (response.status === 200) {
                 alert("Movie Deleted Successfully"); // Alert user on successful deletion
                 updateCallback(); // Notify parent component to refresh the movie list
@@ -94,11 +105,11 @@ const MovieList = ({ movies, updateMovie, updateCallback }) => {
                     >
                         Previous
                     </button>
-                    <span className="text-lg">{`Page ${currentPage} of ${totalPages}`}</span> {/* Display current page out of total pages */}
+                    <span className="text-lg">{`Page ${currentPage} of ${totalPages}${hasMore ? "+" : ""}`}</span> {/* Display current page out of the pages loaded */}
                     <button
                         className="btn-primary"
-                        onClick={() => setPageSafely(currentPage + 1)} // Go to the next page
-                        disabled={currentPage === totalPages} // Disable if already on the last page
+                        onClick={goToNextPage} // Go to the next page
+                        disabled={currentPage === totalPages && !hasMore} // Disable if already on the last page
                     >
                         Next
                     </button>
@@ -106,7 +117,7 @@ const MovieList = ({ movies, updateMovie, updateCallback }) => {
 
                 {/* Total number of movies */}
                 <div className="absolute right-8 top-1/2 transform -translate-y-1/2 text-white font-bold text-xl">
-                    Total Movies: {validMovies.length}
+                    Total Movies: {validMovies.length}{hasMore ? "+" : ""}
                 </div>
             </div>
 
@@ -13,23 +13,17 @@ import {
 // Register necessary Chart.js components
 ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend);
 
-const MovieYearChart = ({ allMovies }) => {
-    // Filter out movies with null or undefined releaseYear
-    const validMovies = allMovies.filter((movie) => movie.releaseYear !== null && movie.releaseYear !== undefined);
-
-    // Count movies by their release year
-    const yearCounts = validMovies.reduce((acc, movie) => {
-        acc[movie.releaseYear] = (acc[movie.releaseYear] || 0) + 1;
-        return acc;
-    }, {});
+const MovieYearChart = ({ yearCounts }) => {
+    // Counts per release year arrive already aggregated from the backend's /stats endpoint
+    const validCounts = yearCounts.filter((entry) => entry.releaseYear !== null && entry.releaseYear !== undefined);
 
     // Prepare the chart data
     const data = {
-        labels: Object.keys(yearCounts), // Years on x-axis
+        labels: validCounts.map((entry) => entry.releaseYear), // Years on x-axis
         datasets: [
             {
                 label: "All Movies by Year",
-                data: Object.values(yearCounts), // Movie counts for each year
+                data: validCounts.map((entry) => entry.count), // Movie counts for each year
                 backgroundColor: "rgba(54, 162, 235, 0.6)", // Bar color
                 borderColor: "blue", // Border color
                 borderWidth: 1, // Border width